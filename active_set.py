@@ -0,0 +1,118 @@
+import numpy as np
+from node import NODE_MODE
+from cost_cache import get_cost_cache, sink_key
+
+# Compacted active sets for the round by round loops. Between two events
+# (an election, a sink move, a fixed head dying) every node pays the same
+# cost each round, so the loops build an ActiveSet of the nodes that still
+# pay and step it. Nodes that die are dropped in bulk, so a round costs time
+# proportional to the nodes still alive, and the dead count is kept up to
+# date instead of being recounted over the whole network. Across elections
+# LiveGroups keeps the group members that can still take part, so elections
+# and the costs after them skip the dead too.
+
+
+class ActiveSet():
+    """The paying nodes of one round's costs, compacted as they die.
+
+    `idx`, `cost` and `is_head` are a round as round_costs or
+    fixed_round_costs return it, `counted` marks the positions of `idx` that
+    count as dead (members, or sensors). With `keep_heads` heads keep paying
+    after they die, as elected heads do until the next election; otherwise
+    dead nodes never pay. Nodes with nothing to pay are left out. `base`
+    dead nodes outside `idx` are added to the dead count, and energies()
+    reports the nodes `reported` (`idx` by default).
+    """
+    def __init__(self, state, idx, cost, is_head, counted, keep_heads=True, base=0, reported=None):
+        self.state = state
+        self.idx = idx
+        self.reported = idx if reported is None else reported
+        self.keep_heads = keep_heads
+        dead = state.dead[idx]
+        self.dead_count = base + int(np.count_nonzero(dead & counted))
+
+        pos = np.flatnonzero(((is_head & keep_heads) | ~dead) & (cost != 0))
+        self.pos = pos  # positions in idx
+        self.nodes = idx[pos]
+        self.cost = cost[pos]
+        self.is_head = is_head[pos]
+        self.counted = counted[pos]
+        self.heads_died = False  # whether a head died in the last step
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def step(self, hooks=None, round=0):
+        """One round of the pay-or-die rule; returns the dead count after it."""
+        nodes = self.nodes
+        self.heads_died = False
+        died = self.state.spend(nodes, self.cost, self.is_head)
+        if not died.any():
+            return self.dead_count
+
+        self.dead_count += int(np.count_nonzero(died & self.counted))
+        if hooks is not None and hooks.wants_deaths:
+            hooks.deaths(round, nodes, died, self.is_head)
+        self.heads_died = bool((died & self.is_head).any())
+        keep = ~died | (self.is_head & self.keep_heads)
+        if not keep.all():
+            self.pos, self.nodes, self.cost = self.pos[keep], nodes[keep], self.cost[keep]
+            self.is_head, self.counted = self.is_head[keep], self.counted[keep]
+        return self.dead_count
+
+    def energies(self):
+        """Energies of all of `reported`, as the collectors get them."""
+        return self.state.energy[self.reported].copy()
+
+
+class LiveGroups():
+    """The members of `groups` that elections and round_costs still visit.
+
+    These are the alive members plus the dead ones whose (frozen) energy
+    still passes the eligibility check energy >= head_sink*C: a dead member
+    can be elected head, so they cannot simply be dropped. update() compacts
+    the set before each election; the dead members are only checked again
+    in full when the sink, C or the state's model changes. `pos` are the
+    positions in groups.members, `in_group` the positions inside each group,
+    `offsets` the CSR bounds of the groups, and `eligible` (after update())
+    whether a member can be head for the next C rounds.
+    """
+    def __init__(self, groups):
+        self.groups = groups
+        self._key = None
+        self.eligible = None
+        self._compact(np.arange(len(groups.members)))
+
+    def _compact(self, pos):
+        groups = self.groups
+        self.pos = pos
+        self.members = groups.members[pos]
+        labels = groups.labels[pos]
+        self.labels = labels
+        self.offsets = np.searchsorted(labels, np.arange(len(groups) + 1))
+        self.in_group = pos - groups.offsets[labels]
+
+    @property
+    def dropped(self):
+        """Members left out, all of them dead."""
+        return len(self.groups.members) - len(self.pos)
+
+    def update(self, sink_x, sink_y, C):
+        """Set up an election at this sink: reset the heads to members and compact."""
+        groups = self.groups
+        state = groups.state
+        key = (state.version, sink_key(sink_x, sink_y), C)
+        if key != self._key:
+            self._key = key
+            self._compact(np.arange(len(groups.members)))
+        # The previous heads are among the members kept so far
+        state.mode[self.members] = NODE_MODE
+
+        nodes = self.members
+        eligible = state.energy[nodes] >= get_cost_cache(state, sink_x, sink_y).head_sink[nodes] * C
+        keep = eligible | ~state.dead[nodes]
+        if not keep.all():
+            self._compact(self.pos[keep])
+            eligible = eligible[keep]
+        self.eligible = eligible
+        return self
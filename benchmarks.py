@@ -0,0 +1,312 @@
+import argparse
+import cProfile
+import io
+import json
+import platform
+import pstats
+import random
+import time
+import tracemalloc
+
+import numpy as np
+import kernels
+from node import NetworkState, Node
+from election import Election
+from hooks import Hooks
+from metrics import EarlyStop
+from simulation import elect_cluster_head, generate_groups, generate_topology, simulate_rotation
+from simulation_fixed_heads import place_fixed_heads, simulate_fixed_heads
+from rendering import use_headless
+from topology import generate_positions
+
+# Benchmarks for the simulation hot paths. Every benchmark returns a plain
+# dict of numbers so results can be dumped as JSON and compared between
+# versions (see compare()). Nothing here plots; the CLI also switches
+# matplotlib to its headless backend in case anything imports it.
+
+SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+SINK = (50, 50)
+
+
+class _DictNode():
+    # The original per-node object: five attributes in an instance __dict__
+    def __init__(self, x, y):
+        self._x = x
+        self._y = y
+        self._energy = 2
+        self._dead = False
+        self._MODE = "node"
+
+
+def _measure(build):
+    """(result, seconds, peak bytes allocated) of build()."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def node_memory(N=1_000_000, seed=0):
+    """Construction time and bytes per node of the node representations.
+
+    state:       NetworkState arrays (position, energy, dead flag, mode)
+    lazy_nodes:  state plus the Nodes sequence simulations pass around
+    node_views:  state plus one __slots__ Node view per node in a list
+    dict_nodes:  one attribute-dict object per node, the original layout
+    """
+    rng = np.random.default_rng(seed)
+    X, Y = rng.uniform(0, 100, N), rng.uniform(0, 100, N)
+
+    builders = {
+        "state": lambda: NetworkState(X, Y),
+        "lazy_nodes": lambda: Node.from_arrays(X, Y),
+        "node_views": lambda: list(Node.from_arrays(X, Y)),
+        "dict_nodes": lambda: [_DictNode(X[i], Y[i]) for i in range(N)],
+    }
+    results = {"N": N}
+    for name, build in builders.items():
+        built, seconds, peak = _measure(build)
+        del built
+        results[name] = {"seconds": seconds, "bytes_per_node": peak / N}
+    return results
+
+
+def _rounds_for(N, budget=2_000_000):
+    # Enough rounds for a stable rate without spending minutes at 1M nodes
+    return int(np.clip(budget // N, 3, 200))
+
+
+def setup_scaling(sizes=SIZES, n_clusters=(5, 50), seed=70):
+    """generate_topology and generate_groups time and peak memory per N and cluster count."""
+    results = []
+    for N in sizes:
+        nodes, seconds, peak = _measure(lambda: generate_topology(N, kind="uniform", seed=seed))
+        row = {"N": N, "topology": {"seconds": seconds, "peak_bytes": peak}, "groups": {}}
+        for n_cluster in n_clusters:
+            _, seconds, peak = _measure(lambda: generate_groups(nodes, n_cluster))
+            row["groups"][n_cluster] = {"seconds": seconds, "peak_bytes": peak}
+        results.append(row)
+    return results
+
+
+def election_scaling(sizes=SIZES, n_clusters=(5, 50), C=5, repeat=5):
+    """Seconds per elect_cluster_head call, random-module picks vs a batched Election."""
+    results = []
+    for N in sizes:
+        for n_cluster in n_clusters:
+            groups = generate_groups(generate_topology(N, kind="uniform"), n_cluster)
+            row = {"N": N, "n_cluster": n_cluster}
+            for name, election in [("legacy", None), ("batched", Election("uniform", 0))]:
+                elect_cluster_head(groups, *SINK, C, election)  # warm the cost cache
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    elect_cluster_head(groups, *SINK, C, election)
+                row[name] = (time.perf_counter() - start) / repeat
+            results.append(row)
+    return results
+
+
+def _loop_rounds(setup, loop, N, rounds, peak_rounds):
+    """Rate, per-phase breakdown and peak memory of one of the simulation loops.
+
+    loop(*setup(), collectors, hooks) runs the loop on a fresh network for
+    at most `rounds` rounds; the phases are the per-round seconds the loop
+    charges to its hooks.Hooks timers. Peak memory is traced on a separate
+    run of `peak_rounds` rounds so it does not skew the timing.
+    """
+    hooks = Hooks()
+    args = setup()
+    start = time.perf_counter()
+    ran = len(loop(*args, [EarlyStop(N, "lifetime", rounds - 1)], hooks))
+    seconds = time.perf_counter() - start
+    args = setup()
+    _, _, peak = _measure(lambda: loop(*args, [EarlyStop(N, "lifetime", peak_rounds - 1)], None))
+    return {"rounds": ran, "rounds_per_second": ran / seconds, "peak_bytes": peak,
+            "phases": {phase: t / ran for phase, t in hooks.timers.items()}}
+
+
+def rotation_rounds(sizes=SIZES, n_clusters=(5, 50), Cs=(2, 5, 10), seed=0, engine="round"):
+    """Rounds per second of simulate_rotation, broken down per phase.
+
+    The phases are election (every C rounds), routing (member/head costs,
+    rebuilt after every election), energy update (pay-or-die over the
+    active set) and metrics. Runs stop after _rounds_for(N) rounds or when
+    the network dies.
+    """
+    results = []
+    for N in sizes:
+        for n_cluster in n_clusters:
+            for C in Cs:
+                def setup():
+                    random.seed(seed)
+                    return (generate_groups(generate_topology(N, kind="uniform"), n_cluster),)
+
+                def loop(groups, collectors, hooks):
+                    return simulate_rotation(groups, *SINK, C, engine=engine, collectors=collectors, hooks=hooks)
+
+                rounds = _rounds_for(N)
+                results.append({"N": N, "n_cluster": n_cluster, "C": C,
+                                **_loop_rounds(setup, loop, N, rounds, min(rounds, 2 * C))})
+    return results
+
+
+def fixed_rounds(sizes=SIZES, n_heads=(5, 50), R=25, seed=70, engine="round"):
+    """Rounds per second of simulate_fixed_heads, per phase (routing, energy_update, metrics)."""
+    results = []
+    for N in sizes:
+        X, Y = generate_positions(N, seed=seed)
+        for heads in n_heads:
+            def setup():
+                return place_fixed_heads(X, Y, R, SINK, heads)
+
+            def loop(nodes, cluster_heads, groups, collectors, hooks):
+                return simulate_fixed_heads(nodes, cluster_heads, groups, *SINK, engine, collectors, hooks=hooks)
+
+            rounds = _rounds_for(N)
+            results.append({"N": N, "n_heads": heads, **_loop_rounds(setup, loop, N, rounds, min(rounds, 5))})
+    return results
+
+
+def _backend_runs(N, seed):
+    # Raw kernel calls on mixed alive/dead nodes and heads, then whole runs
+    rng = np.random.default_rng(seed)
+    energy, dead = rng.uniform(0, 1, N), rng.random(N) < 0.3
+    idx = rng.permutation(N)[:N // 2]
+    died = kernels.spend(energy, dead, idx, rng.uniform(0, 1, len(idx)), rng.random(len(idx)) < 0.2)
+    results = [energy, dead, died]
+
+    X, Y = generate_positions(N, seed=seed)
+    groups = generate_groups(NetworkState(X, Y).nodes(), 5)
+    results.append(simulate_rotation(groups, *SINK, 5, election=Election("uniform", seed)))
+    results += [groups.state.energy, groups.state.dead]
+    nodes, cluster_heads, heads = place_fixed_heads(X, Y, 25, SINK)
+    results.append(simulate_fixed_heads(nodes, cluster_heads, heads, *SINK))
+    results.append(nodes.state.energy)
+    return results
+
+
+def check_backends(backends=None, N=300, seed=0):
+    """Whether every kernel backend gives bit-identical results to the numpy one.
+
+    Runs the kernel on its own and whole rotation and fixed-head simulations
+    on each of `backends` (all available ones by default); returns
+    {backend: all results equal}.
+    """
+    previous = kernels.get_backend()
+    runs = {}
+    try:
+        for name in ["numpy"] + [name for name in backends or kernels.available_backends() if name != "numpy"]:
+            kernels.set_backend(name)
+            runs[name] = _backend_runs(N, seed)
+    finally:
+        kernels.set_backend(previous)
+    return {name: all(np.array_equal(a, b) for a, b in zip(runs["numpy"], results)) for name, results in runs.items()}
+
+
+BENCHMARKS = {
+    "node_memory": node_memory,
+    "setup_scaling": setup_scaling,
+    "election_scaling": election_scaling,
+    "rotation_rounds": rotation_rounds,
+    "fixed_rounds": fixed_rounds,
+}
+
+
+def run_benchmarks(names=None, sizes=SIZES):
+    """Results of the named BENCHMARKS (all by default) with some metadata, ready for JSON."""
+    results = {}
+    for name in names or BENCHMARKS:
+        if name == "node_memory":
+            results[name] = node_memory(max(sizes))
+        else:
+            results[name] = BENCHMARKS[name](sizes=sizes)
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "backend": kernels.get_backend(),
+            "machine": platform.machine(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+
+def profile(name, sizes=(10_000,), top=20):
+    """cProfile one benchmark and return the `top` functions by cumulative time."""
+    profiler = cProfile.Profile()
+    profiler.runcall(BENCHMARKS[name], sizes=sizes)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    return out.getvalue()
+
+
+def _rates(results, path=()):
+    # Flatten every rounds_per_second / seconds entry to {path: value}
+    rates = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            if key in ("rounds_per_second", "seconds") and isinstance(value, (int, float)):
+                rates[path + (key,)] = value
+            else:
+                rates.update(_rates(value, path + (str(key),)))
+    elif isinstance(results, list):
+        for row in results:
+            label = tuple(f"{key}={row[key]}" for key in ("N", "n_cluster", "n_heads", "C") if key in row)
+            rates.update(_rates(row, path + label))
+    return rates
+
+
+def compare(baseline, current, tolerance=0.2):
+    """Entries where `current` is more than `tolerance` slower than `baseline` (result dicts)."""
+    old, new = _rates(baseline["results"]), _rates(current["results"])
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        # Rates should not drop, durations should not grow
+        ratio = old[key] / new[key] if key[-1] == "rounds_per_second" else new[key] / old[key]
+        if ratio > 1 + tolerance:
+            regressions.append({"benchmark": "/".join(key), "baseline": old[key], "current": new[key], "slowdown": ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmarks and print (or save) their results as JSON")
+    parser.add_argument("names", nargs="*", default=list(BENCHMARKS), help=f"benchmarks to run, from {sorted(BENCHMARKS)}")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="network sizes N")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="report regressions against an earlier JSON result")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before --compare reports it")
+    parser.add_argument("--profile", action="store_true", help="print a cProfile summary of each benchmark instead")
+    parser.add_argument("--backend", default="numpy", choices=kernels.BACKENDS, help="round kernel backend to benchmark")
+    parser.add_argument("--check-backends", action="store_true", help="only check that all backends give identical results")
+    args = parser.parse_args(argv)
+    use_headless()
+
+    if args.check_backends:
+        matches = check_backends()
+        for name, equal in matches.items():
+            print(f"{name}: {'identical' if equal else 'DIFFERENT'}")
+        if not all(matches.values()):
+            raise SystemExit(1)
+        return
+    kernels.set_backend(args.backend)
+
+    if args.profile:
+        for name in args.names:
+            print(profile(name, args.sizes))
+        return
+
+    results = run_benchmarks(args.names, args.sizes)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for regression in regressions:
+            print(f"slower: {regression['benchmark']} x{regression['slowdown']:.2f}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import glob
+import json
+import os
+import pickle
+import random
+
+import numpy as np
+from node import NetworkState, Nodes, gather_nodes
+from election import Election
+from grouping import Groups, as_groups
+from routing import Router, make_router
+
+# Checkpoints of long lifetime runs. A checkpoint is one .npz file with the
+# network arrays (positions, energies, dead flags, modes, which also say who
+# the current heads are), the grouping, the round counter, the dead counts so
+# far, the random state of the election, the current relay routes, the
+# energy model, the sink path and the pickled collectors. Runs can resume
+# from any checkpoint, or branch from it with a different election, routing
+# or engine.
+
+
+class Checkpointer():
+    """Saves a checkpoint every `every` rounds into `directory`."""
+    def __init__(self, directory, every=1000, prefix="checkpoint"):
+        self.directory = directory
+        self.every = every
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, rounds):
+        return os.path.join(self.directory, f"{self.prefix}_{rounds:010d}.npz")
+
+    def due(self, rounds, span=1):
+        """Whether the last `span` rounds, ending after `rounds` rounds, crossed a multiple of every."""
+        return rounds // self.every > (rounds - span) // self.every
+
+    def save_rotation(self, rounds, groups, elected_heads, dead_counts, sink_x, sink_y, C, R, collectors=(),
+                      election=None, router=None, sink_path=None, dead_group="last"):
+        groups = as_groups(groups)
+        params = {"sink_x": _sink(sink_x), "sink_y": _sink(sink_y), "C": int(C), "R": R, "dead_group": dead_group}
+        return save_checkpoint(self.path(rounds), "rotation", groups.state, rounds, dead_counts, params, collectors,
+                               groups=groups, elected_heads=elected_heads, election=election, router=router,
+                               sink_path=sink_path)
+
+    def save_fixed(self, rounds, nodes, cluster_heads, dead_counts, sink_x, sink_y, collectors=(), router=None,
+                   sink_path=None):
+        state, idx = gather_nodes(nodes + cluster_heads)
+        params = {"sink_x": _sink(sink_x), "sink_y": _sink(sink_y)}
+        return save_checkpoint(self.path(rounds), "fixed", state, rounds, dead_counts, params, collectors,
+                               node_idx=idx[:len(nodes)], head_idx=idx[len(nodes):], router=router, sink_path=sink_path)
+
+    def paths(self):
+        return list_checkpoints(self.directory, self.prefix)
+
+
+def _sink(position):
+    # One sink position as a float, several as a list
+    return np.asarray(position, dtype=float).tolist()
+
+
+def _pack(obj):
+    return np.frombuffer(pickle.dumps(obj), dtype=np.uint8)
+
+
+def _unpack(array):
+    return pickle.loads(array.tobytes())
+
+
+def _election_state(election, state):
+    if election is None:
+        return None
+    return {"policy": election.policy, "p": election.p, "rounds": election.rounds,
+            "rng": election.rng.bit_generator.state, "last_head": election.last_head.get(state)}
+
+
+def _restore_election(saved, state):
+    if saved is None:
+        return None
+    election = Election(saved["policy"], p=saved["p"])
+    election.rng.bit_generator.state = saved["rng"]
+    election.rounds = saved["rounds"]
+    if saved["last_head"] is not None:
+        election.last_head[state] = saved["last_head"]
+    return election
+
+
+def _router_state(router, state):
+    # Routes are only rebuilt when the heads change, so the ones in use are part of the run
+    if router is None or router._key is None or router._key[0] != id(state):
+        return None
+    return {"R": router.R, "relay": router.relay, "key": router._key[2:], "costs": router._costs}
+
+
+def _restore_router(saved, state):
+    if saved is None:
+        return None
+    router = Router(saved["R"], saved["relay"])
+    router._key = (id(state), state.version) + tuple(saved["key"])
+    router._costs = saved["costs"]
+    return router
+
+
+def save_checkpoint(path, kind, state, rounds, dead_counts, params, collectors=(), groups=None,
+                    elected_heads=None, election=None, node_idx=None, head_idx=None, router=None, sink_path=None):
+    """Write one checkpoint file (atomically) and return its path.
+
+    `kind` is "rotation" (with groups, elected_heads, election) or "fixed"
+    (with node_idx and head_idx into the state); `params` are the sink and
+    C/R of the run as a JSON-able dict, `router` the routing.Router in use
+    and `sink_path` the sinks.SinkPath of a mobile sink.
+    """
+    arrays = {
+        "x": state.x, "y": state.y, "energy": state.energy, "dead": state.dead, "mode": state.mode,
+        "rounds": np.int64(rounds), "dead_counts": np.asarray(dead_counts, dtype=np.int64),
+        "meta": np.array(json.dumps({"kind": kind, "params": params})),
+        "random_state": _pack(random.getstate()),
+        "election": _pack(_election_state(election, state)),
+        "router": _pack(_router_state(router, state)),
+        "model": _pack(state.model),
+        "sink_path": _pack(sink_path),
+        "collectors": _pack(list(collectors)),
+    }
+    if kind == "rotation":
+        groups = as_groups(groups)
+        arrays.update(members=groups.members, labels=groups.labels, n_groups=np.int64(len(groups)),
+                      elected_heads=np.asarray(elected_heads, dtype=np.int64))
+    else:
+        arrays.update(node_idx=np.asarray(node_idx), head_idx=np.asarray(head_idx))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+class Checkpoint():
+    """A loaded checkpoint, ready to resume() (change its fields to branch)."""
+    def __init__(self, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            self.kind = meta["kind"]
+            self.params = meta["params"]
+            self.state = NetworkState(data["x"], data["y"], data["energy"], _unpack(data["model"]))
+            self.state.dead[:] = data["dead"]
+            self.state.mode[:] = data["mode"]
+            self.rounds = int(data["rounds"])
+            self.dead_counts = data["dead_counts"]
+            self.random_state = _unpack(data["random_state"])
+            self.election = _restore_election(_unpack(data["election"]), self.state)
+            self.router = _restore_router(_unpack(data["router"]), self.state)
+            self.collectors = _unpack(data["collectors"])
+            self.sink_path = _unpack(data["sink_path"])
+            if self.kind == "rotation":
+                self.groups = Groups(self.state, data["members"], data["labels"], int(data["n_groups"]))
+                self.elected_heads = [int(head) for head in data["elected_heads"]]
+            else:
+                self.nodes = Nodes(self.state, data["node_idx"])
+                self.cluster_heads = Nodes(self.state, data["head_idx"])
+
+
+def load_checkpoint(path):
+    return Checkpoint(path)
+
+
+def list_checkpoints(directory, prefix="checkpoint"):
+    """Checkpoint files in `directory`, oldest round first."""
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}_*.npz")))
+
+
+def resume(checkpoint, engine="round", routing=None, hooks=None, checkpoints=None):
+    """Continue a run from a Checkpoint (or its path) until it ends.
+
+    The run keeps the checkpoint's election and routes; to branch, replace
+    checkpoint.election, or pass `routing` ("direct", a routing.RELAYS mode
+    or a Router; fixed-head runs take a Router). Returns (dead_counts,
+    collectors) for the whole run, rounds before the checkpoint included.
+    """
+    from simulation import simulate_rotation
+    from simulation_fixed_heads import simulate_fixed_heads
+
+    if not isinstance(checkpoint, Checkpoint):
+        checkpoint = Checkpoint(checkpoint)
+    params = checkpoint.params
+    routing = checkpoint.router if routing is None else make_router(routing, params.get("R"))
+    if checkpoint.kind == "rotation":
+        dead_counts = simulate_rotation(checkpoint.groups, params["sink_x"], params["sink_y"], params["C"], params["R"],
+                                        engine, checkpoint.collectors, checkpoint.election, routing, hooks,
+                                        checkpoints, checkpoint, sink_path=checkpoint.sink_path,
+                                        dead_group=params.get("dead_group", "last"))
+    else:
+        dead_counts = simulate_fixed_heads(checkpoint.nodes, checkpoint.cluster_heads, None,
+                                           params["sink_x"], params["sink_y"], engine, checkpoint.collectors,
+                                           routing, hooks, checkpoints, checkpoint, sink_path=checkpoint.sink_path)
+    return dead_counts, checkpoint.collectors
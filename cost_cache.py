@@ -0,0 +1,133 @@
+import numpy as np
+from node import distance, nearest_sink
+from spatial import HeadAssignment
+
+# Nodes never move, so every radio cost of a topology can be computed once
+# and looked up every round. Costs between nodes (LinkCache) are kept once
+# per NetworkState (member costs only for the current head of each group);
+# costs to the sink (CostCache) once per sink position, or
+# set of positions when there are several sinks and heads use the nearest.
+# A moving sink only computes the entries a round asks for, and at most
+# MAX_SINK_TABLES positions are kept per state, least recently used out. Moving a node through
+# Node.x / Node.y or switching the state's EnergyModel drops all caches of
+# its state.
+
+MAX_SINK_TABLES = 16
+
+
+class LinkCache():
+    """Node to node costs of one state, independent of where the sink is."""
+    def __init__(self, state):
+        self.state = state
+        self._member_costs = {}
+        self._assignments = {}
+
+    def member_costs(self, head, members, slot=None):
+        """Tx cost of every node in `members` to node `head`.
+
+        The costs are kept per `slot` (a group id) until the slot asks for
+        another head, so memory stays bounded by the groups' sizes while
+        rounds between two elections only look them up.
+        """
+        cached = self._member_costs.get(slot)
+        if cached is not None and cached[0] == head and np.array_equal(cached[1], members):
+            return cached[2]
+
+        state = self.state
+        costs = state.model.transmit(distance(state.x[members], state.y[members], state.x[head], state.y[head]), members)
+        self._member_costs[slot] = (head, members.copy(), costs)
+        return costs
+
+    def head_assignment(self, nodes, heads):
+        """HeadAssignment of `nodes` to the fixed `heads`, kept up to date across rounds."""
+        key = (nodes.tobytes(), heads.tobytes())
+        if key not in self._assignments:
+            self._assignments[key] = HeadAssignment(self.state, nodes, heads)
+        return self._assignments[key]
+
+
+class CostCache():
+    """Costs to the sink(s) at one position: head_sink and node_sink per node.
+
+    The full tables are built on first use; head_costs() answers a few
+    nodes without building them.
+    """
+    def __init__(self, state, sink_x, sink_y):
+        self.state = state
+        self.sink_x = sink_x
+        self.sink_y = sink_y
+        self.version = state.version
+        self.links = get_link_cache(state)
+        self._node_sink = None
+        self._head_sink = None
+        self._sink_of = None
+
+    def is_valid(self):
+        return self.version == self.state.version
+
+    def _sink_distances(self):
+        state = self.state
+        return nearest_sink(state.x, state.y, self.sink_x, self.sink_y)
+
+    @property
+    def node_sink(self):
+        """A member sending straight to the sink."""
+        if self._node_sink is None:
+            self._node_sink = self.state.model.transmit(self._sink_distances()[0])
+        return self._node_sink
+
+    @property
+    def head_sink(self):
+        """A head: Rx + aggregation + Tx to the sink."""
+        if self._head_sink is None:
+            self._head_sink = self.state.model.head(self._sink_distances()[0])
+        return self._head_sink
+
+    @property
+    def sink_of(self):
+        """Nearest (cheapest) sink of every node."""
+        if self._sink_of is None:
+            self._sink_of = self._sink_distances()[1]
+        return self._sink_of
+
+    def head_costs(self, idx):
+        """head_sink[idx], from the table if it is built, else for `idx` only."""
+        if self._head_sink is not None:
+            return self._head_sink[idx]
+        state = self.state
+        sink_dist, _ = nearest_sink(state.x[idx], state.y[idx], self.sink_x, self.sink_y)
+        return state.model.head(sink_dist, idx)
+
+    def member_costs(self, head, members, slot=None):
+        return self.links.member_costs(head, members, slot)
+
+    def head_assignment(self, nodes, heads):
+        return self.links.head_assignment(nodes, heads)
+
+
+def get_link_cache(state):
+    cache = state.cost_caches.get("links")
+    if cache is None:
+        cache = state.cost_caches["links"] = LinkCache(state)
+    return cache
+
+
+def sink_key(sink_x, sink_y):
+    """Hashable key of one sink position or of a set of sinks."""
+    if np.ndim(sink_x) == 0:
+        return (float(sink_x), float(sink_y))
+    return (tuple(np.asarray(sink_x, dtype=float).tolist()), tuple(np.asarray(sink_y, dtype=float).tolist()))
+
+
+def get_cost_cache(state, sink_x, sink_y):
+    """The CostCache of `state` for this sink (or these sinks), built on first use."""
+    key = sink_key(sink_x, sink_y)
+    # Reinserted on every use, so the first table in the dict is the least recently used
+    cache = state.cost_caches.pop(key, None)
+    if cache is None or not cache.is_valid():
+        cache = CostCache(state, sink_x, sink_y)
+    state.cost_caches[key] = cache
+    tables = [k for k in state.cost_caches if not isinstance(k, str)]  # "links" and routers are no sink tables
+    if len(tables) > MAX_SINK_TABLES:
+        del state.cost_caches[tables[0]]
+    return cache
@@ -0,0 +1,254 @@
+import multiprocessing
+import os
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+from node import NetworkState, NODE_MODE, HEAD_MODE, distance, nearest_sink
+from grouping import Groups, as_groups, grid_labels, group_nodes
+from topology import generate_positions
+from active_set import ActiveSet
+from metrics import MilestoneCollector, notify, stopped
+
+# Domain-decomposed rotating-head runs for fields too large for one process.
+# The node state (positions, energies, dead flags, modes) lives in shared
+# memory, and every worker process maps it zero-copy as its own NetworkState.
+# The groups are split into partitions, either spatial tiles of group
+# centroids or balanced runs of group ids, and each worker elects and steps
+# only its partition's groups. Groups never interact when heads send straight
+# to the sink, so the workers only meet at round boundaries: the parent sums
+# their dead counts, feeds the collectors and decides when to stop. Each group
+# draws its heads from its own seeded Generator, so a run does not depend on
+# the number of workers or on how the groups are partitioned.
+
+PARTITIONS = ("tiles", "groups")
+
+
+def _share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, array.dtype, buffer=shm.buf)
+    view[:] = array
+    return shm, view, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype, buffer=shm.buf)
+
+
+def _wrap(arrays, model):
+    # A NetworkState over existing arrays instead of fresh copies
+    state = NetworkState(np.empty(0), np.empty(0), model=model)
+    state.x, state.y, state.energy, state.dead, state.mode = arrays
+    return state
+
+
+class SharedState():
+    """A copy of a NetworkState whose arrays live in shared memory.
+
+    The creating process owns the blocks and unlinks them on close();
+    workers attach() the picklable `specs` and see the same arrays.
+    """
+    FIELDS = ("x", "y", "energy", "dead", "mode")
+
+    def __init__(self, state):
+        self.blocks, views, self.specs = zip(*(_share(getattr(state, field)) for field in self.FIELDS))
+        self.state = _wrap(views, state.model)
+
+    @staticmethod
+    def attach(specs, model):
+        """(blocks, NetworkState) in a worker; close the blocks when done."""
+        blocks, views = zip(*(_attach(spec) for spec in specs))
+        return blocks, _wrap(views, model)
+
+    def close(self):
+        self.state = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+def partition_groups(groups, n_parts, partition="tiles"):
+    """Group ids of each of at most `n_parts` partitions (empty ones are dropped).
+
+    "tiles" cuts the field into rectangles by group centroid, "groups" cuts
+    the group ids into runs of about the same number of members.
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f"Unknown partition '{partition}', choose from {PARTITIONS}")
+    groups = as_groups(groups)
+    sizes = groups.sizes
+    if partition == "tiles":
+        state = groups.state
+        count = np.maximum(sizes, 1)
+        cx = np.bincount(groups.labels, state.x[groups.members], len(groups)) / count
+        cy = np.bincount(groups.labels, state.y[groups.members], len(groups)) / count
+        labels = grid_labels(NetworkState(cx, cy), np.arange(len(groups)), n_parts)
+    else:
+        bounds = np.cumsum(sizes) - sizes / 2  # middle of each group
+        labels = np.minimum((bounds * n_parts / max(sizes.sum(), 1)).astype(np.intp), n_parts - 1)
+    parts = [np.flatnonzero(labels == part) for part in range(n_parts)]
+    return [part for part in parts if len(part) > 0]
+
+
+def _partition_members(groups, group_ids):
+    """(members, sizes) of the groups `group_ids`, group after group."""
+    return np.concatenate([groups.indices(g) for g in group_ids]), groups.sizes[group_ids]
+
+
+class Partition():
+    """The groups `group_ids` (their `members` and `sizes`), elected and stepped on `state`.
+
+    Heads are picked uniformly among the members that can afford C rounds
+    as head, members of dead groups report to the group's last node (the
+    "last" handling of simulation.round_costs).
+    """
+    def __init__(self, state, members, sizes, group_ids, sink_x, sink_y, C, seed):
+        self.state = state
+        self.groups = Groups(state, members, np.repeat(np.arange(len(group_ids)), sizes), len(group_ids))
+        self.rngs = [np.random.default_rng([seed, int(g)]) for g in group_ids]
+        sink_dist, _ = nearest_sink(state.x[members], state.y[members], sink_x, sink_y)
+        self.head_cost = state.model.head(sink_dist, members)
+        self.C = C
+        self.heads = np.full(len(group_ids), -1)
+        self.active = None
+
+    def elect(self):
+        groups, state = self.groups, self.state
+        eligible = state.energy[groups.members] >= self.head_cost * self.C
+        state.mode[groups.members] = NODE_MODE
+        for g, rng in enumerate(self.rngs):
+            candidates = np.flatnonzero(eligible[groups.offsets[g]:groups.offsets[g + 1]])
+            self.heads[g] = candidates[rng.integers(len(candidates))] if len(candidates) > 0 else -1
+        alive = self.heads >= 0
+        state.mode[groups.members[groups.offsets[:-1][alive] + self.heads[alive]]] = HEAD_MODE
+
+    def costs(self):
+        """(cost, is_head) of the partition's members under the current heads."""
+        groups, state = self.groups, self.state
+        members = groups.members
+        target = np.where(self.heads >= 0, groups.offsets[:-1] + self.heads, groups.offsets[1:] - 1)
+        target = members[np.repeat(target, groups.sizes)]
+        cost = state.model.transmit(distance(state.x[members], state.y[members], state.x[target], state.y[target]), members)
+        is_head = state.mode[members] == HEAD_MODE
+        cost[is_head] = self.head_cost[is_head]
+        return cost, is_head
+
+    def step(self, round):
+        """Round `round` of these groups; returns (dead count, groups still alive)."""
+        if round % self.C == 0:
+            self.elect()
+            cost, is_head = self.costs()
+            self.active = ActiveSet(self.state, self.groups.members, cost, is_head, ~is_head)
+        return self.active.step(), int(np.count_nonzero(self.heads >= 0))
+
+
+def _worker(specs, model, members, sizes, group_ids, sink_x, sink_y, C, seed, control_spec, part, barrier):
+    blocks, state = SharedState.attach(specs, model)
+    control_block, control = _attach(control_spec)
+    partition = None
+    try:
+        partition = Partition(state, members, sizes, group_ids, sink_x, sink_y, C, seed)
+        round = 0
+        while True:
+            barrier.wait()
+            if control[-1]:
+                break
+            control[2 * part:2 * part + 2] = partition.step(round)
+            round += 1
+            barrier.wait()
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        # The arrays must go before the blocks they map can be closed
+        state = partition = control = None
+        for block in blocks + (control_block,):
+            block.close()
+
+
+def simulate_domains(groups, sink_x, sink_y, C, workers=None, partition="tiles", seed=0, collectors=()):
+    """Rotating-head run of `groups` split over `workers` processes until every group is dead.
+
+    Returns the per-round dead counts like simulation.simulate_rotation and
+    leaves the final energies, dead flags and modes in the groups' state;
+    collectors see energies in groups.members order. workers=1 runs the
+    partitions in this process, without shared memory. Heads send straight
+    to the sink(s); `seed` seeds the per-group head elections.
+    """
+    groups = as_groups(groups)
+    state = groups.state
+    parts = partition_groups(groups, workers or os.cpu_count(), partition)
+    order = groups.members
+    dead_counts = []
+    round = 0
+
+    if workers == 1:
+        partitions = [Partition(state, *_partition_members(groups, part), part, sink_x, sink_y, C, seed) for part in parts]
+        while True:
+            counts = np.array([partition.step(round) for partition in partitions])
+            dead_counts.append(int(counts[:, 0].sum()))
+            notify(collectors, round, dead_counts[-1:], lambda offsets: [state.energy[order]] * len(offsets))
+            round += 1
+            if counts[:, 1].sum() == 0 or stopped(collectors):
+                return np.array(dead_counts)
+
+    shared = SharedState(state)
+    control_block, control, control_spec = _share(np.zeros(2 * len(parts) + 1, dtype=np.int64))
+    barrier = multiprocessing.Barrier(len(parts) + 1)
+    processes = [multiprocessing.Process(target=_worker, daemon=True,
+                                         args=(shared.specs, state.model, *_partition_members(groups, part), part, sink_x,
+                                               sink_y, C, seed, control_spec, i, barrier))
+                 for i, part in enumerate(parts)]
+    try:
+        for process in processes:
+            process.start()
+        energy = shared.state.energy
+        while True:
+            barrier.wait()
+            barrier.wait()
+            counts = control[:-1].reshape(-1, 2)
+            dead_counts.append(int(counts[:, 0].sum()))
+            notify(collectors, round, dead_counts[-1:], lambda offsets: [energy[order]] * len(offsets))
+            round += 1
+            if counts[:, 1].sum() == 0 or stopped(collectors):
+                control[-1] = 1
+                barrier.wait()
+                break
+        for process in processes:
+            process.join()
+    except threading.BrokenBarrierError:
+        raise RuntimeError("A domain worker failed, see its traceback above") from None
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for field in SharedState.FIELDS:
+            getattr(state, field)[:] = getattr(shared.state, field)
+        energy = control = counts = None
+        control_block.close()
+        control_block.unlink()
+        shared.close()
+    return np.array(dead_counts)
+
+
+def run_domain_simulation(sink_x, sink_y, N_sensors, C=5, field=(0, 100, 0, 100), n_groups=64, workers=None,
+                          partition="tiles", kind="uniform", seed=70):
+    """run_simulation for large fields: a domain-decomposed run on `workers` processes.
+
+    Sensors are deployed over `field` (x1, x2, y1, y2) and grouped in
+    n_groups grid tiles; sink_x, sink_y may be several sinks. Returns what
+    run_simulation returns.
+    """
+    X, Y = generate_positions(N_sensors, kind, *field, seed=seed)
+    nodes = NetworkState(X, Y).nodes()
+    groups = group_nodes(nodes, n_groups, "grid", x1=field[0], x2=field[1], y1=field[2], y2=field[3])
+
+    milestones = MilestoneCollector(N_sensors)
+    dead_counts = simulate_domains(groups, sink_x, sink_y, C, workers, partition, seed, [milestones])
+
+    special_cycles = milestones.special_cycles
+    special_values = N_sensors - dead_counts[special_cycles]
+    return (N_sensors - dead_counts, milestones.special_energies, np.array(special_cycles) + 1, np.array(special_values),
+            nodes)
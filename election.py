@@ -0,0 +1,135 @@
+import numpy as np
+from node import HEAD_MODE
+from grouping import as_groups
+from active_set import LiveGroups
+
+# Batched cluster-head elections. Every policy turns the candidates of all
+# groups into one array of keys (-inf for nodes that cannot afford to be head
+# for C rounds) and every group elects its member with the largest key, so an
+# election is a handful of array operations regardless of the group count.
+
+POLICIES = ("uniform", "leach", "energy", "weighted")
+SKIP_DRAWS = 1024  # gaps in the members wider than this are skipped, not drawn
+
+
+def group_argmax(keys, offsets):
+    """Position inside each group of its largest key, the first one on ties.
+
+    `keys` holds the members group after group along the last axis (extra
+    leading axes are independent replicates), offsets are the CSR group
+    bounds. Groups that are empty or only have -inf keys get -1.
+    """
+    sizes = np.diff(offsets)
+    best = np.full(keys.shape[:-1] + (len(sizes),), -1, dtype=np.intp)
+    filled = np.flatnonzero(sizes > 0)
+    if len(filled) == 0:
+        return best
+
+    starts = offsets[filled]
+    top = np.maximum.reduceat(keys, starts, axis=-1)
+    segment = np.repeat(np.arange(len(filled)), sizes[filled])
+    pos = np.arange(keys.shape[-1]) - np.repeat(starts, sizes[filled])
+    first = np.minimum.reduceat(np.where(keys == top[..., segment], pos, keys.shape[-1]), starts, axis=-1)
+    best[..., filled] = np.where(top > -np.inf, first, -1)
+    return best
+
+
+def uniform_draws(rng, shape, positions=None, total=None):
+    """rng.random(shape), or rng.random(total)[positions] for a subset of members.
+
+    A subset only draws around its (increasing) positions when the bit
+    generator can skip single draws (the PCG64 family), and leaves the
+    generator where drawing all `total` values would, so elections over the
+    members still alive get the keys the whole groups would.
+    """
+    if positions is None:
+        return rng.random(shape)
+    bitgen = rng.bit_generator
+    if not isinstance(bitgen, (np.random.PCG64, np.random.PCG64DXSM)):
+        return rng.random(total)[positions]
+
+    draws = np.empty(len(positions))
+    done = 0
+    breaks = np.flatnonzero(np.diff(positions) > SKIP_DRAWS) + 1
+    runs = zip(np.r_[0, breaks], np.r_[breaks, len(positions)]) if len(positions) else ()
+    for first, last in runs:
+        start = positions[first]
+        bitgen.advance(int(start) - done)
+        done = int(positions[last - 1]) + 1
+        draws[first:last] = rng.random(done - start)[positions[first:last] - start]
+    bitgen.advance(total - done)
+    return draws
+
+
+def policy_keys(policy, rng, energy, eligible, fresh=None, positions=None, total=None):
+    """Election keys for `policy`, -inf where not `eligible`.
+
+    uniform:  every eligible member equally likely (a random key each).
+    energy:   highest residual energy, lowest index on ties.
+    weighted: probability proportional to residual energy, drawn with
+              Efraimidis-Spirakis keys log(u) / energy.
+    leach:    LEACH rotation. T(n) is zero for nodes that were head within
+              the current epoch (the set G excludes them) and equal for the
+              rest of a group, so with one head per group the threshold draw
+              is a uniform pick among the `fresh` members; groups that used
+              up G fall back to any eligible member.
+
+    `positions` and `total` mark the members as a subset of `total`, see
+    uniform_draws.
+    """
+    if policy == "uniform":
+        keys = uniform_draws(rng, energy.shape, positions, total)
+    elif policy == "energy":
+        keys = np.array(energy, dtype=float)
+    elif policy == "weighted":
+        with np.errstate(divide="ignore"):
+            keys = np.log(uniform_draws(rng, energy.shape, positions, total)) / energy
+    elif policy == "leach":
+        keys = uniform_draws(rng, energy.shape, positions, total) + fresh
+    else:
+        raise ValueError(f"Unknown election policy '{policy}', choose from {POLICIES}")
+    return np.where(eligible, keys, -np.inf)
+
+
+class Election():
+    """Cluster-head elector with its own np.random.Generator.
+
+    For "leach" the epoch is 1/p elections; p defaults to one over the size of
+    the node's group, so every member gets its turn once per epoch.
+    """
+    def __init__(self, policy="uniform", seed=None, p=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown election policy '{policy}', choose from {POLICIES}")
+        self.policy = policy
+        self.rng = np.random.default_rng(seed)
+        self.p = p
+        self.rounds = 0  # elections held so far
+        self.last_head = {}  # election a node was last head in, per NetworkState
+
+    def elect(self, groups, sink_x, sink_y, C, live=None):
+        """Elect one head per group; returns head positions inside the groups, -1 for dead groups.
+
+        `live` (active_set.LiveGroups of `groups`) carried from election to
+        election limits the work to the members that can still take part.
+        """
+        groups = as_groups(groups)
+        live = (LiveGroups(groups) if live is None else live).update(sink_x, sink_y, C)
+        state, members = groups.state, live.members
+
+        energy = state.energy[members]
+        fresh = None
+        if self.policy == "leach":
+            last = self.last_head.setdefault(state, np.full(len(state), -np.inf))
+            sizes = groups.sizes[live.labels]
+            epoch = np.round(1 / self.p) if self.p else sizes
+            fresh = self.rounds - last[members] >= epoch
+
+        keys = policy_keys(self.policy, self.rng, energy, live.eligible, fresh, live.pos, len(groups.members))
+        heads = group_argmax(keys, live.offsets)
+        elected = live.offsets[:-1][heads >= 0] + heads[heads >= 0]
+        state.mode[members[elected]] = HEAD_MODE
+        if self.policy == "leach":
+            last[members[elected]] = self.rounds
+        self.rounds += 1
+        heads[heads >= 0] = live.in_group[elected]
+        return [int(head) for head in heads]
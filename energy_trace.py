@@ -0,0 +1,143 @@
+import json
+import os
+
+import numpy as np
+
+# Full per-round energy traces on disk. A trace is a raw memory-mapped file
+# with one row per round and one column per node, in the float width picked
+# by the writer, plus a small JSON sidecar (dtype, node count, rounds). The
+# writer is a collector, so the engines stream into it; the reader maps the
+# file and only touches the rounds and nodes asked for.
+
+CHUNK_BYTES = 64 << 20  # at most this much of a span is rebuilt in memory at once
+
+
+def _meta_path(path):
+    return path + ".json"
+
+
+class TraceWriter():
+    """Collector appending every round's energy vector to a memory-mapped file.
+
+    The file grows by doubling, starting at `capacity` rounds. Call close()
+    (or use it as a context manager) to trim the file and write the sidecar.
+    """
+    def __init__(self, path, dtype="float64", capacity=1024):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.n_nodes = None
+        self.rounds = 0
+        self._data = None
+
+    def _reserve(self, rounds):
+        if self._data is not None and rounds <= len(self._data):
+            return
+        size = self.capacity if self._data is None else len(self._data)
+        if self._data is None and os.path.exists(self.path):
+            # Reopened, e.g. in a run resumed from a checkpoint
+            size = max(size, os.path.getsize(self.path) // (self.n_nodes * self.dtype.itemsize))
+        while size < rounds:
+            size *= 2
+        self._resize(size)
+
+    def _resize(self, size):
+        if self._data is not None:
+            self._data.flush()
+            self._data = None
+        with open(self.path, "ab") as f:
+            f.truncate(size * self.n_nodes * self.dtype.itemsize)
+        self._data = np.memmap(self.path, self.dtype, "r+", shape=(size, self.n_nodes))
+
+    def on_span(self, start, dead_counts, energies_at):
+        n_rounds = len(dead_counts)
+        if self.n_nodes is None:
+            self.n_nodes = len(energies_at(np.arange(1))[0])
+        self._reserve(start + n_rounds)
+        step = max(1, CHUNK_BYTES // (self.n_nodes * 8))
+        for first in range(0, n_rounds, step):
+            offsets = np.arange(first, min(first + step, n_rounds))
+            self._data[start + first:start + first + len(offsets)] = energies_at(offsets)
+        # A resumed run rewrites the rounds after its checkpoint
+        self.rounds = start + n_rounds
+
+    def close(self):
+        if self.n_nodes is None:
+            return
+        self._resize(self.rounds)
+        self._data.flush()
+        self._data = None
+        with open(_meta_path(self.path), "w") as f:
+            json.dump({"dtype": self.dtype.str, "n_nodes": self.n_nodes, "rounds": self.rounds}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # Checkpoints pickle collectors; the mapping is reopened on the next write
+        if self._data is not None:
+            self._data.flush()
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+
+class Trace():
+    """Read-only trace; indexing reads only the requested rounds and nodes.
+
+    trace[a:b] are the energies of rounds a..b-1, trace[rounds, nodes]
+    any NumPy index of both; rows(rounds) gives lazy per-round vectors.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(_meta_path(path)) as f:
+            meta = json.load(f)
+        self.dtype = np.dtype(meta["dtype"])
+        self.shape = (meta["rounds"], meta["n_nodes"])
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.memmap(self.path, self.dtype, "r", shape=self.shape)
+        return self._data
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        return np.array(self.data[key])
+
+    def energies(self, rounds=slice(None), nodes=slice(None)):
+        """Energies of a round range (slice or indices) for a node subset."""
+        if isinstance(rounds, slice):
+            return np.array(self.data[rounds][:, nodes])
+        return np.array(self.data[np.asarray(rounds)][:, nodes])
+
+    def rows(self, rounds):
+        return [TraceRow(self, int(round)) for round in rounds]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+
+class TraceRow():
+    """Energy vector of one round, read from the trace when converted with np.asarray."""
+    def __init__(self, trace, round):
+        self.trace = trace
+        self.round = round
+
+    def __len__(self):
+        return self.trace.shape[1]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.trace.data[self.round], dtype=dtype)
+
+
+def open_trace(path):
+    return Trace(path)
@@ -0,0 +1,227 @@
+import random
+
+import numpy as np
+from metrics import notify, stopped
+from simulation import elect_cluster_head, round_costs
+from simulation_fixed_heads import fixed_round_costs
+from sinks import span_until_move
+
+# Event-driven ("skip-ahead") engines. Between two events every node pays the
+# same cost each round, so the rounds in between can be applied in bulk. The
+# events are a head re-election (iter % C == 0) in rotation mode, a head
+# death in fixed-head mode, and a sink move (or checkpoint) in both; node
+# deaths inside a span are located exactly and only fill in the per-round
+# dead counts. Results are identical to the round by round loops, including
+# the last bit of every energy value.
+
+NEVER = 2**62  # horizon used to look for the next event
+
+
+def advance_energy(energy, cost, active, rounds):
+    """Apply `rounds` rounds of the pay-or-die rule with constant costs.
+
+    Every active node pays `cost` each round, or dies and keeps its energy
+    once it cannot afford it, exactly as NetworkState.spend would. `rounds`
+    is a scalar or one round count per node. Returns the new energies and,
+    per node, the 1-based round of the span in which it died (0 if it did
+    not).
+
+    Repeating `e - c` in floating point is not the same as `e - n*c`. Inside
+    one binade [2**p, 2**(p+1)) though, `e - c` always rounds to `e - d` for
+    the same grid multiple `d`, so whole runs of rounds are applied with an
+    exact integer multiple of `d` and only binade crossings (and rounding
+    ties) are stepped one by one.
+    """
+    e = np.array(energy, dtype=float)
+    died = np.zeros(len(e), dtype=np.int64)
+    rounds = np.broadcast_to(np.asarray(rounds, dtype=np.int64), e.shape)
+    left = np.where(active, rounds, 0)
+
+    todo = np.flatnonzero(left > 0)
+    while len(todo) > 0:
+        e0, c = e[todo], cost[todo]
+        dies = e0 - c < 0
+        died[todo[dies]] = rounds[todo[dies]] - left[todo[dies]] + 1
+        left[todo[dies]] = 0
+        todo, e0, c = todo[~dies], e0[~dies], c[~dies]
+
+        e1 = e0 - c
+        e2 = e1 - c
+        d1, d2 = e0 - e1, e1 - e2
+
+        _, exponent = np.frexp(e0)
+        low = np.ldexp(0.5, exponent)  # bottom of e0's binade
+        ulp = np.ldexp(1.0, exponent - 53)  # grid spacing inside it
+        a, b = (e0 - low) / ulp, d1 / ulp
+        # Steps that keep every intermediate value at least one ulp above the
+        # binade bottom; a zero decrement never changes anything again
+        bulk = np.where(b > 0, np.floor((a - 1) / np.where(b > 0, b, 1)), left[todo])
+        # d1 != d2 means a rounding tie whose outcome depends on parity
+        bulk = np.where(d1 == d2, bulk, 1)
+        steps = np.clip(bulk, 1, left[todo]).astype(np.int64)
+
+        e[todo] = np.where(steps == 1, e1, e0 - steps * d1)
+        left[todo] -= steps
+        todo = todo[left[todo] > 0]
+
+    return e, died
+
+
+def _span_energies(energy, cost, active):
+    """energies_at(offsets) for a span starting from `energy`, see metrics.py."""
+    def energies_at(offsets):
+        snapshots = {}
+        current, done = energy, 0
+        for offset in sorted(set(int(offset) for offset in offsets)):
+            # Nodes that died earlier just die again without paying, so
+            # stepping on from the previous snapshot is exact
+            current, _ = advance_energy(current, cost, active, offset + 1 - done)
+            done = offset + 1
+            snapshots[offset] = current
+        return [snapshots[int(offset)] for offset in offsets]
+    return energies_at
+
+
+def _dead_counts(base, died, counted, rounds):
+    """Per-round dead count over a span given each node's death round."""
+    deaths = np.bincount(died[counted & (died > 0)] - 1, minlength=rounds)[:rounds]
+    return base + np.cumsum(deaths)
+
+
+def _until_checkpoint(checkpoints, rounds, span):
+    # Spans stop at checkpoint rounds so checkpoints land where the round loop takes them
+    if checkpoints is None:
+        return span
+    return min(span, checkpoints.every - rounds % checkpoints.every)
+
+
+def run_rotation_events(groups, sink_x, sink_y, C, R=25, collectors=(), election=None, router=None, hooks=None,
+                        checkpoints=None, resume=None, sink_path=None, dead_group="last"):
+    """Event-driven simulate_rotation loop for rotating heads.
+
+    Returns the per-round dead counts; collectors see energies in
+    run_iteration order, hooks get the round loop's events replayed per span.
+    """
+    dead_counts = []
+    rounds = 0
+    elected_heads = []
+    if resume is not None:
+        dead_counts = [np.asarray(resume.dead_counts)]
+        rounds = resume.rounds
+        elected_heads = list(resume.elected_heads)
+        random.setstate(resume.random_state)
+    while True:
+        if sink_path is not None:
+            sink_x, sink_y = sink_path.at(rounds)
+        if hooks is not None:
+            hooks.start()
+        elected = rounds % C == 0
+        if elected:
+            elected_heads = elect_cluster_head(groups, sink_x, sink_y, C, election)
+        if hooks is not None:
+            hooks.lap("election")
+        state, order, cost, is_head = round_costs(groups, elected_heads, sink_x, sink_y, router, dead_group)
+        if hooks is not None:
+            hooks.lap("routing")
+        # The round loop stops right after the first round with every group dead
+        last = elected_heads.count(-1) == len(groups)
+        span = 1 if last else _until_checkpoint(checkpoints, rounds, span_until_move(sink_path, rounds, C - rounds % C))
+
+        active = is_head | ~state.dead[order]
+        start_energy = state.energy[order]
+        energy, died = advance_energy(start_energy, cost, active, span)
+        if hooks is not None:
+            hooks.lap("energy_update")
+
+        counted = ~is_head & ~state.dead[order]
+        base = np.count_nonzero(state.dead[order] & ~is_head)
+        dead_counts.append(_dead_counts(base, died, counted, span))
+        notify(collectors, rounds, dead_counts[-1], _span_energies(start_energy, cost, active))
+        if hooks is not None:
+            hooks.lap("metrics")
+            hooks.replay_span(rounds, dead_counts[-1], order, died, state.dead[order], is_head,
+                              (groups, elected_heads) if elected else None)
+            hooks.lap("hooks")
+
+        state.energy[order] = energy
+        state.dead[order[died > 0]] = True
+        rounds += span
+        if last or stopped(collectors):
+            break
+        if checkpoints is not None and checkpoints.due(rounds, span):
+            checkpoints.save_rotation(rounds, groups, elected_heads, np.concatenate(dead_counts), sink_x, sink_y, C, R,
+                                      collectors, election, router, sink_path, dead_group)
+
+    return np.concatenate(dead_counts)
+
+
+def run_fixed_head_events(nodes, cluster_heads, sink_x, sink_y, collectors=(), router=None, hooks=None,
+                          checkpoints=None, resume=None, sink_path=None):
+    """Event-driven simulate_fixed_heads loop.
+
+    Jumps from one head death to the next. Returns the per-round dead counts;
+    collectors see energies of the sensors followed by the heads.
+    """
+    n_nodes = len(nodes)
+    dead_counts = []
+    rounds = 0
+    if resume is not None:
+        dead_counts = [np.asarray(resume.dead_counts)]
+        rounds = resume.rounds
+    while True:
+        if sink_path is not None:
+            sink_x, sink_y = sink_path.at(rounds)
+        if hooks is not None:
+            hooks.start()
+        state, idx, cost, heads_left = fixed_round_costs(nodes, cluster_heads, sink_x, sink_y, router)
+        is_sensor = np.arange(len(idx)) < n_nodes
+        active = ~state.dead[idx]
+        if hooks is not None:
+            hooks.lap("routing")
+
+        if not heads_left:
+            # Orphaned sensors give up, as in run_fixed_head_iteration
+            state.dead[idx[is_sensor]] = True
+            dead_counts.append(np.array([n_nodes]))
+            notify(collectors, rounds, dead_counts[-1], lambda offsets: [state.energy[idx]] * len(offsets))
+            if hooks is not None:
+                hooks.replay_span(rounds, dead_counts[-1], idx, is_sensor.astype(np.int64), ~active, ~is_sensor)
+            break
+
+        # Next event: the first head death, or the round the last sensor dies
+        _, died = advance_energy(state.energy[idx], cost, active, NEVER)
+        head_deaths = died[~is_sensor & active]
+        node_deaths = died[is_sensor & active]
+        span = NEVER
+        if (head_deaths > 0).any():
+            span = head_deaths[head_deaths > 0].min()
+        if (node_deaths > 0).all():
+            span = min(span, node_deaths.max() if len(node_deaths) else 1)
+        if span == NEVER:
+            raise RuntimeError("No sensor or head ever runs out of energy, the simulation would not end")
+        span = _until_checkpoint(checkpoints, rounds, span_until_move(sink_path, rounds, span))
+
+        start_energy = state.energy[idx]
+        energy, died = advance_energy(start_energy, cost, active, span)
+        if hooks is not None:
+            hooks.lap("energy_update")
+
+        base = np.count_nonzero(state.dead[idx[is_sensor]])
+        dead_counts.append(_dead_counts(base, died, is_sensor & active, span))
+        notify(collectors, rounds, dead_counts[-1], _span_energies(start_energy, cost, active))
+        if hooks is not None:
+            hooks.lap("metrics")
+            hooks.replay_span(rounds, dead_counts[-1], idx, died, ~active, ~is_sensor)
+            hooks.lap("hooks")
+
+        state.energy[idx] = energy
+        state.dead[idx[died > 0]] = True
+        rounds += span
+
+        if state.dead[idx[~is_sensor]].all() or dead_counts[-1][-1] == n_nodes or stopped(collectors):
+            break
+        if checkpoints is not None and checkpoints.due(rounds, span):
+            checkpoints.save_fixed(rounds, nodes, cluster_heads, np.concatenate(dead_counts), sink_x, sink_y, collectors,
+                                   router, sink_path)
+
+    return np.concatenate(dead_counts)
@@ -0,0 +1,215 @@
+from collections.abc import Mapping
+
+import numpy as np
+from node import Nodes, distance, gather_nodes
+from spatial import HeadIndex
+
+# Grouping strategies. A strategy labels every node of a network with its
+# group in one vectorized pass; the labels are turned into a Groups object,
+# which keeps the members CSR style (one index array into the NetworkState
+# plus group offsets) instead of one Python list of Node objects per group.
+
+
+class Groups(Mapping):
+    """Node groups of one NetworkState in CSR form.
+
+    members[offsets[g]:offsets[g + 1]] are the state indices of group g, in
+    node order. Reads like the dict of Node lists the simulations used to pass
+    around: groups[g] is a lazy node.Nodes sequence of group g, while the
+    engines work on indices(g) directly.
+    """
+    def __init__(self, state, members, labels, n_groups, strategy=None, params=None):
+        order = np.argsort(labels, kind="stable")
+        self.state = state
+        self.members = np.asarray(members, dtype=np.intp)[order]
+        self.labels = np.asarray(labels, dtype=np.intp)[order]
+        self.offsets = np.searchsorted(self.labels, np.arange(n_groups + 1))
+        self.strategy = strategy
+        self.params = params or {}
+
+    @classmethod
+    def from_dict(cls, groups):
+        """Groups from a dict of Node lists, keys taken in dict order."""
+        lists = list(groups.values())
+        state, idx = gather_nodes([node for group in lists for node in group])
+        labels = np.repeat(np.arange(len(lists)), [len(group) for group in lists])
+        return cls(state, idx, labels, len(lists))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __getitem__(self, g):
+        if not 0 <= g < len(self):
+            raise KeyError(g)
+        return Nodes(self.state, self.indices(g))
+
+    def indices(self, g):
+        return self.members[self.offsets[g]:self.offsets[g + 1]]
+
+    @property
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def relabel(self, positions, new_labels):
+        """Groups with the members at `positions` (into self.members) moved to `new_labels`.
+
+        Labels below 0 drop the member. Only the moved members are touched
+        before the single re-sort.
+        """
+        labels = self.labels.copy()
+        labels[positions] = new_labels
+        keep = labels >= 0
+        return Groups(self.state, self.members[keep], labels[keep], len(self), self.strategy, self.params)
+
+    def alive(self):
+        """Groups without the dead members (self if nobody died)."""
+        dead = np.flatnonzero(self.state.dead[self.members])
+        if len(dead) == 0:
+            return self
+        return self.relabel(dead, -1)
+
+
+def as_groups(groups):
+    """Groups for either a Groups object or a legacy dict of Node lists."""
+    if isinstance(groups, Groups):
+        return groups
+    return Groups.from_dict(groups)
+
+
+def sector_labels(state, idx, n_groups, center=(50, 50)):
+    """Angular sectors of equal width around `center`, counted from the +x axis."""
+    center_x, center_y = center
+    angles = np.arctan2(state.y[idx] - center_y, state.x[idx] - center_x)
+    angles = (angles + 2 * np.pi) % (2 * np.pi)
+
+    sectors = np.linspace(0, 2 * np.pi, n_groups + 1)
+    labels = np.searchsorted(sectors, angles, side="right") - 1
+    return np.where(labels < n_groups, labels, -1)
+
+
+def grid_labels(state, idx, n_groups, x1=None, x2=None, y1=None, y2=None):
+    """Rectangular tiles, cols x rows == n_groups with the tiles as square as possible."""
+    x, y = state.x[idx], state.y[idx]
+    x1 = x.min() if x1 is None else x1
+    x2 = x.max() if x2 is None else x2
+    y1 = y.min() if y1 is None else y1
+    y2 = y.max() if y2 is None else y2
+    width, height = max(x2 - x1, 1e-12), max(y2 - y1, 1e-12)
+
+    divisors = [d for d in range(1, n_groups + 1) if n_groups % d == 0]
+    cols = min(divisors, key=lambda d: abs(np.log(d / np.sqrt(n_groups * width / height))))
+    rows = n_groups // cols
+    col = np.clip(((x - x1) / width * cols).astype(np.intp), 0, cols - 1)
+    row = np.clip(((y - y1) / height * rows).astype(np.intp), 0, rows - 1)
+    return row * cols + col
+
+
+def kmeans_labels(state, idx, n_groups, seed=0, n_iter=50, tol=1e-4, centers=None):
+    """Lloyd's k-means on node positions.
+
+    Starts from `centers` (x, y arrays) when given, otherwise from n_groups
+    random nodes. Stops once no center moves more than `tol` times the
+    field size.
+    """
+    x, y = state.x[idx], state.y[idx]
+    if centers is None:
+        rng = np.random.default_rng(seed)
+        start = rng.choice(len(x), size=min(n_groups, len(x)), replace=False)
+        cx = np.resize(x[start], n_groups)
+        cy = np.resize(y[start], n_groups)
+    else:
+        cx, cy = np.array(centers[0], dtype=float), np.array(centers[1], dtype=float)
+    span = max(np.ptp(x), np.ptp(y)) if len(x) else 0.0
+
+    for _ in range(n_iter):
+        labels = _nearest_center(x, y, cx, cy)
+        counts = np.bincount(labels, minlength=n_groups)
+        filled = counts > 0  # an empty cluster keeps its center
+        new_cx, new_cy = cx.copy(), cy.copy()
+        new_cx[filled] = np.bincount(labels, x, n_groups)[filled] / counts[filled]
+        new_cy[filled] = np.bincount(labels, y, n_groups)[filled] / counts[filled]
+        moved = distance(cx, cy, new_cx, new_cy).max()
+        cx, cy = new_cx, new_cy
+        if moved <= tol * span:
+            break
+    return _nearest_center(x, y, cx, cy)
+
+
+def _nearest_center(x, y, cx, cy, chunk=1 << 16):
+    if len(cx) > 64:
+        # Many centers, let the grid index skip the far ones
+        return HeadIndex(cx, cy).nearest(x, y)[0]
+    # |p - c|^2 up to the |p|^2 term every center shares, as one matmul per chunk
+    points = np.column_stack([x, y])
+    centers = -2 * np.vstack([cx, cy])
+    offset = cx**2 + cy**2
+    labels = np.empty(len(x), dtype=np.intp)
+    for start in range(0, len(x), chunk):
+        d2 = points[start:start + chunk] @ centers
+        d2 += offset
+        labels[start:start + chunk] = np.argmin(d2, axis=1)
+    return labels
+
+
+def nearest_head_labels(state, idx, n_groups, heads):
+    """Nearest alive fixed head, `heads` being n_groups state indices."""
+    index = HeadIndex(state.x[heads], state.y[heads])
+    index.alive[:] = ~state.dead[heads]
+    labels, _ = index.nearest(state.x[idx], state.y[idx])
+    return labels
+
+
+STRATEGIES = {
+    "sector": sector_labels,
+    "grid": grid_labels,
+    "kmeans": kmeans_labels,
+    "nearest_head": nearest_head_labels,
+}
+
+
+def group_nodes(nodes, n_groups, strategy="sector", **kwargs):
+    """Group `nodes` (Node list or (state, idx) pair) with one of the STRATEGIES.
+
+    Nodes a strategy leaves unassigned (label -1) are not in any group.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown grouping '{strategy}', choose from {sorted(STRATEGIES)}")
+    state, idx = nodes if isinstance(nodes, tuple) else gather_nodes(nodes)
+    labels = STRATEGIES[strategy](state, idx, n_groups, **kwargs)
+    keep = labels >= 0
+    return Groups(state, idx[keep], labels[keep], n_groups, strategy, kwargs)
+
+
+def regroup(groups):
+    """Follow node deaths without regrouping the whole network.
+
+    Dead members leave their groups. Sectors and tiles only depend on
+    position, so nothing else changes; nearest_head moves just the members of
+    dead heads; kmeans re-runs Lloyd from the current centers on the
+    survivors, which usually settles in a step or two.
+    """
+    if groups.strategy == "kmeans" and len(groups.members) > 0:
+        # Centers of the groups as they were, survivors start from those
+        state, n = groups.state, len(groups)
+        counts = np.bincount(groups.labels, minlength=n)
+        fallback = (state.x[groups.members].mean(), state.y[groups.members].mean())
+        centers = tuple(np.where(counts > 0, np.bincount(groups.labels, coord[groups.members], n) / np.maximum(counts, 1), mean)
+                        for coord, mean in zip((state.x, state.y), fallback))
+
+    groups = groups.alive()
+    if groups.strategy == "nearest_head":
+        heads = np.asarray(groups.params["heads"])
+        orphans = np.flatnonzero(groups.state.dead[heads[groups.labels]])
+        if len(orphans) == 0:
+            return groups
+        labels = nearest_head_labels(groups.state, groups.members[orphans], len(groups), heads)
+        return groups.relabel(orphans, labels)
+
+    if groups.strategy == "kmeans" and len(groups.members) > 0:
+        params = {**groups.params, "centers": centers}
+        return group_nodes((groups.state, groups.members), len(groups), "kmeans", **params)
+
+    return groups
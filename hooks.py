@@ -0,0 +1,124 @@
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# Observer hooks on the simulation loops. Any object implementing some of
+#
+#     on_round_start(round)
+#     on_election(round, groups, elected_heads)
+#     on_node_death(round, idx)       # state indices of sensors that died
+#     on_head_death(round, idx)       # state indices of heads that died
+#     on_round_end(round, dead_count)
+#
+# can be registered through a Hooks object passed to simulate_rotation or
+# simulate_fixed_heads. Rounds are 0-based like the collectors'. The loops
+# only touch hooks behind an `if hooks is not None`, and death detection
+# only runs when someone listens for deaths, so an unhooked run pays nothing.
+# The skip-ahead engines replay the same per-round events after each span.
+
+EVENTS = ("on_round_start", "on_election", "on_node_death", "on_head_death", "on_round_end")
+
+
+class Hooks():
+    """Registered observers plus per-phase timers and per-event counters.
+
+    `timers` accumulate seconds per loop phase (election, routing,
+    energy_update, metrics, hooks); `counters` count emitted events and
+    reported deaths.
+    """
+    def __init__(self, *observers):
+        self.observers = list(observers)
+        self.handlers = {event: [getattr(observer, event) for observer in observers if hasattr(observer, event)]
+                         for event in EVENTS}
+        self.wants_deaths = bool(self.handlers["on_node_death"] or self.handlers["on_head_death"])
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+        self._clock = time.perf_counter()
+
+    def emit(self, event, *args):
+        self.counters[event] += 1
+        for handler in self.handlers[event]:
+            handler(*args)
+
+    def start(self):
+        self._clock = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the last start/lap to `phase`."""
+        now = time.perf_counter()
+        self.timers[phase] += now - self._clock
+        self._clock = now
+
+    def deaths(self, round, idx, newly_dead, is_head):
+        """Emit the death events for the `newly_dead` positions of `idx`."""
+        nodes = idx[newly_dead & ~is_head]
+        heads = idx[newly_dead & is_head]
+        if len(nodes) > 0:
+            self.counters["node_deaths"] += len(nodes)
+            self.emit("on_node_death", round, nodes)
+        if len(heads) > 0:
+            self.counters["head_deaths"] += len(heads)
+            self.emit("on_head_death", round, heads)
+
+    def replay_span(self, start, dead_counts, idx, died, was_dead, is_head, election=None):
+        """Per-round events of a span the skip-ahead engines applied in bulk.
+
+        `died` holds the 1-based round of the span each position of `idx` died
+        in (0 if it did not), `election` the (groups, elected_heads) of an
+        election held at the start of the span.
+        """
+        died = np.where(was_dead, 0, died)
+        for offset, dead_count in enumerate(dead_counts):
+            round = start + offset
+            self.emit("on_round_start", round)
+            if offset == 0 and election is not None:
+                self.emit("on_election", round, *election)
+            if self.wants_deaths:
+                self.deaths(round, idx, died == offset + 1, is_head)
+            self.emit("on_round_end", round, int(dead_count))
+
+    def summary(self):
+        return {"timers": dict(self.timers), "counters": dict(self.counters)}
+
+
+class Progress():
+    """Prints the dead count every `every` rounds, for long runs."""
+    def __init__(self, every=100, out=print):
+        self.every = every
+        self.out = out
+
+    def on_round_end(self, round, dead_count):
+        if round % self.every == 0:
+            self.out(f"round {round}: {dead_count} dead")
+
+
+class DeathLog():
+    """Round of death of every node and head, as (round, state index) pairs."""
+    def __init__(self):
+        self.nodes = []
+        self.heads = []
+
+    def on_node_death(self, round, idx):
+        self.nodes.extend((round, int(i)) for i in idx)
+
+    def on_head_death(self, round, idx):
+        self.heads.extend((round, int(i)) for i in idx)
+
+
+class DeadGroups():
+    """Round in which every group was first found dead (no head candidate left).
+
+    `dead` maps group id to round; with an `out` callable each newly dead
+    group is also reported, e.g. DeadGroups(out=print).
+    """
+    def __init__(self, out=None):
+        self.dead = {}
+        self.out = out
+
+    def on_election(self, round, groups, elected_heads):
+        for group_idx, head in enumerate(elected_heads):
+            if head < 0 and group_idx not in self.dead:
+                self.dead[group_idx] = round
+                if self.out is not None:
+                    self.out(f"Group {group_idx} is dead")
@@ -0,0 +1,103 @@
+import numpy as np
+
+# Round kernels behind a backend chosen at runtime. The kernel applies one
+# round of the pay-or-die rule to nodes `idx` of a state's energy and dead
+# arrays and reports who died in it:
+#
+#   "numpy"   whole-array operations (the default, always available)
+#   "numba"   _spend_loop compiled with numba.njit, one fused pass over the
+#             nodes doing the death check, the energy update and the death
+#             detection without temporaries; numba is optional
+#   "python"  the same loop uncompiled, slow, to check the loop without numba
+#
+# Every backend computes each node's `energy - cost` exactly once, so all of
+# them give bit-identical results. Costs are looked up before the kernel
+# runs (round_costs, active_set.ActiveSet), so the loop itself has no
+# branching on groups or heads beyond the is_head flag. `idx` must not
+# repeat a node.
+
+BACKENDS = ("numpy", "numba", "python")
+
+
+def _spend_numpy(energy, dead, idx, cost, is_head):
+    was_dead = dead[idx]
+    remaining = energy[idx] - cost
+    active = is_head | ~was_dead
+    short = remaining < 0
+    dead[idx[active & short]] = True
+    paid = active & ~short
+    energy[idx[paid]] = remaining[paid]
+    return active & short & ~was_dead
+
+
+def _spend_loop(energy, dead, idx, cost, is_head, died):
+    for i in range(len(idx)):
+        node = idx[i]
+        if is_head[i] or not dead[node]:
+            remaining = energy[node] - cost[i]
+            if remaining < 0:
+                died[i] = not dead[node]
+                dead[node] = True
+            else:
+                energy[node] = remaining
+
+
+def _looped(loop):
+    def spend(energy, dead, idx, cost, is_head):
+        idx = np.asarray(idx, dtype=np.intp)
+        died = np.zeros(len(idx), dtype=bool)
+        cost = np.broadcast_to(np.asarray(cost, dtype=float), idx.shape)
+        is_head = np.broadcast_to(np.asarray(is_head, dtype=bool), idx.shape)
+        loop(energy, dead, idx, cost, is_head, died)
+        return died
+    return spend
+
+
+def _compile(name):
+    if name == "numpy":
+        return _spend_numpy
+    if name == "python":
+        return _looped(_spend_loop)
+    try:
+        import numba
+    except ImportError:
+        raise ImportError("The numba backend needs numba installed, or use the numpy backend") from None
+    return _looped(numba.njit(cache=True, nogil=True)(_spend_loop))
+
+
+_backend = "numpy"
+_spend = _spend_numpy
+
+
+def set_backend(name):
+    """Run the round kernel on backend `name` (one of BACKENDS) from now on."""
+    global _backend, _spend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', choose from {BACKENDS}")
+    _spend = _compile(name)
+    _backend = name
+
+
+def get_backend():
+    return _backend
+
+
+def available_backends():
+    """The BACKENDS usable here (numba only when it is installed)."""
+    available = []
+    for name in BACKENDS:
+        try:
+            _compile(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def spend(energy, dead, idx, cost, is_head):
+    """One round of the pay-or-die rule for nodes `idx`, in place; returns the mask of fresh deaths.
+
+    A node only pays while alive, a head always tries to pay, and whoever
+    cannot afford its cost dies with its energy left untouched.
+    """
+    return _spend(energy, dead, idx, cost, is_head)
@@ -1,15 +1,20 @@
+import argparse
+import os
 from simulation import run_simulation, graph_topology
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-import pickle
-from simulation_fixed_heads import run_fixed_head_simulation, graph_topology_with_heads, find_optimal_R
+from simulation_fixed_heads import run_fixed_head_simulation, graph_topology_with_heads, lifetime_vs_R, plot_lifetime_vs_R
+from energy_trace import TraceWriter
+from rendering import figure_job, finish_figure, render_figures, show_figures
+from result_cache import ResultCache
+from topology import DEPLOYMENTS
+import kernels
 
 N_SENSORS = 100 # No. of Sensors
 
 
 
-def plot_dead_counts(dead_counts,special_cycles,special_values,sim_case):
+def plot_dead_counts(dead_counts,special_cycles,special_values,sim_case, show=True, save_path=None):
+    import matplotlib.pyplot as plt
     X_coords = range(1,len(dead_counts)+1)
     y_coords = dead_counts
     
@@ -25,79 +30,111 @@ def plot_dead_counts(dead_counts,special_cycles,special_values,sim_case):
     plt.title(title)
     plt.xlabel('Cycle')
     plt.ylabel('Active Node Count')
-    plt.show()
-    # fig.savefig(f'Figures//{sim_case}//{im_text},{title}.jpg')
+    return finish_figure(fig, show, save_path)
+    
+
+CYCLES = [f'After {d} Death' for d in ['First', 'Half Nodes', 'Last']]
 
-    # with open(f'Figures//{sim_case}//{im_text},{title}.fig', 'wb') as fig_file:
-    #     pickle.dump(fig, fig_file)
+def plot_remaining_energy(energies, sim_case, cycle, show=True, save_path=None):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    y_coords = np.asarray(energies) # energy_trace rows are only read here
+    X_coords = range(1,len(y_coords)+1) #Node
+    
+    fig = plt.figure(figsize=(14, 6))
+    
+    # Bar plot on the left
+    plt.subplot(1, 2, 1)
+    plt.bar(X_coords, y_coords, color='blue', alpha=0.6)
+    plt.xlim(0, 100)
+    plt.ylim(0, 2)
+    title = f'{sim_case} - Remaining Node Energies {cycle}'
+    plt.title(title)
+    plt.xlabel('Node')
+    plt.ylabel('Energy (Joule)')
+    plt.grid(True)
     
+    # Distribution plot (histogram + KDE) on the right
+    plt.subplot(1, 2, 2)
+    sns.histplot(y_coords, bins=20, kde=True, color='purple', alpha=0.6)
+    plt.xlim(0, 2)
+    plt.title(f'{sim_case} - Energy Distribution {cycle}')
+    plt.xlabel('Energy (Joule)')
+    plt.ylabel('Density')
+    return finish_figure(fig, show, save_path)
 
-def plot_remaining_energies(rem_energies,sim_case,nodes):
-    cycles = [f'After {d} Death' for d in ['First', 'Half Nodes', 'Last']]
+def remaining_energy_jobs(rem_energies, sim_case, nodes, sink):
+    """Figure jobs for the remaining energies at each milestone (and the topology for Rotation)
+
+    `rem_energies` may be lazy energy_trace rows; each job then carries the
+    trace path and round, and reads the energies where it is rendered.
+    """
+    jobs = []
     for i in range(len(rem_energies)):
-        # X_coords = np.linspace(1, 101, len(rem_energies[i]))
-        X_coords = range(1,len(rem_energies[i])+1) #Cycle
-        y_coords = rem_energies[i]
-        
-        # Scatter plot
-        fig = plt.figure(figsize=(14, 6))
-        
-        # Scatter plot on the left
-        plt.subplot(1, 2, 1)
-        # plt.scatter(X_coords, y_coords, marker='x', color='blue', alpha=0.6)
-        plt.bar(X_coords, y_coords, color='blue', alpha=0.6)
-        plt.xlim(0, 100)
-        plt.ylim(0, 2)
-        title = f'{sim_case_str} - Remaining Node Energies {cycles[i]}'
-        plt.title(title)
-        plt.xlabel('Node')
-        plt.ylabel('Energy (Joule)')
-        plt.grid(True)
-        
-        # Distribution plot (histogram + KDE) on the right
-        plt.subplot(1, 2, 2)
-        sns.histplot(y_coords, bins=20, kde=True, color='purple', alpha=0.6)
-        plt.xlim(0, 2)
-        plt.title(f'{sim_case_str} - Energy Distribution {cycles[i]}')
-        plt.xlabel('Energy (Joule)')
-        plt.ylabel('Density')
-        plt.show()
-        
-        # title = f'{sim_case} {im_text} {title}'
-        # fig.savefig(f'Figures//{sim_case}//{im_text},{title}.jpg')
-        # fig_path = f'Figures//{sim_case}//{im_text},{title}.fig'
-        # with open(fig_path, 'wb') as fig_file:
-        #     pickle.dump(fig, fig_file)
-        #     plt.tight_layout()
-        #     plt.show()
-        if sim_case_str == "Rotation":
-            graph_topology(nodes, s[0],s[1],sim_case_str,rem_energies[i],cycles[i])
+        name = f'{sim_case} - {CYCLES[i]}'
+        jobs.append(figure_job(plot_remaining_energy, f'{name} - Energies.png', rem_energies[i], sim_case, CYCLES[i]))
+        if sim_case == "Rotation":
+            jobs.append(figure_job(graph_topology, f'{name} - Topology.png', nodes, sink[0], sink[1], sim_case, rem_energies[i], CYCLES[i]))
+    return jobs
 
-if __name__ == "__main__":
-    simulations = [(50,50)]
-    sim_case = 1
-    C = 5
+def plot_remaining_energies(rem_energies,sim_case,nodes,sink=(50,50)):
+    show_figures(remaining_energy_jobs(rem_energies, sim_case, nodes, sink))
 
-    for s in simulations:
+def _trace(args, sim_case):
+    if args.trace is None:
+        return None
+    return TraceWriter(os.path.join(args.trace, f'{sim_case}.trace'), args.trace_dtype)
 
-        sim_case_str = 'Rotation'
-        dead_counts , rem_energies, special_cycles, special_values, nodes = run_simulation(s[0],s[1], N_SENSORS,sim_case_str, C)
-        plot_dead_counts(dead_counts,special_cycles,special_values,sim_case_str) 
-        plot_remaining_energies(rem_energies,sim_case_str, nodes)
-        
-        sim_case_str = 'optimum C'
-        best_remaining_energies = run_simulation(s[0],s[1], N_SENSORS,sim_case_str, C)
-        plot_remaining_energies([best_remaining_energies, best_remaining_energies, best_remaining_energies],sim_case_str, nodes)
-        
-        sim_case_str = 'Fixed'
-        dead_counts , rem_energies, special_cycles, special_values, nodes, cluster_heads = run_fixed_head_simulation(s[0],s[1], N_SENSORS,R = 25)
-        plot_dead_counts(dead_counts,special_cycles,special_values,sim_case_str) 
-        plot_remaining_energies(rem_energies,sim_case_str, nodes.extend(cluster_heads))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the WSN lifetime simulations and plot the results")
+    parser.add_argument("--sink", type=float, nargs=2, default=(50, 50), metavar=("X", "Y"), help="sink position")
+    parser.add_argument("--sensors", type=int, default=N_SENSORS, help="number of sensors")
+    parser.add_argument("-C", type=int, default=5, help="re-election period of the rotating heads")
+    parser.add_argument("-R", type=float, default=25, help="placement radius of the fixed heads (and relay distance of routed heads)")
+    parser.add_argument("--deployment", default="legacy", choices=sorted(DEPLOYMENTS),
+                        help="sensor deployment, the quadratic legacy lattice reproduces the original figures")
+    parser.add_argument("--seed", type=int, default=70, help="seed of the sensor deployment")
+    parser.add_argument("--out", help="write the figures as PNG files to this directory instead of showing them")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes used to render figures with --out")
+    parser.add_argument("--trace", metavar="DIR", help="keep every round's energies in memory-mapped traces in this directory")
+    parser.add_argument("--trace-dtype", default="float64", choices=["float16", "float32", "float64"], help="float width of the traces")
+    parser.add_argument("--cache", metavar="DIR", help="keep topologies and deterministic results in this directory across runs")
+    parser.add_argument("--cache-size", type=int, default=256, metavar="MB", help="size the cache is kept under")
+    parser.add_argument("--backend", default="numpy", choices=kernels.BACKENDS, help="backend of the per-round energy kernel")
+    args = parser.parse_args(argv)
+    kernels.set_backend(args.backend)
+    if args.trace:
+        os.makedirs(args.trace, exist_ok=True)
+    cache = ResultCache(args.cache, args.cache_size << 20) if args.cache else None
 
-        R_range = np.linspace(1, 30, 7)  # Test R values from 15m to 45m
-        optimal_R = find_optimal_R(50, 50, 100, R_range)
+    s = args.sink
+    C = args.C
+    deployment = dict(kind=args.deployment, seed=args.seed)
+    jobs = []
 
-        
+    sim_case_str = 'Rotation'
+    dead_counts , rem_energies, special_cycles, special_values, nodes = run_simulation(s[0],s[1], args.sensors,sim_case_str, R=args.R, C=C, trace=_trace(args, sim_case_str), cache=cache, **deployment)
+    jobs.append(figure_job(plot_dead_counts, f'{sim_case_str} - Active Counts.png', dead_counts,special_cycles,special_values,sim_case_str))
+    jobs += remaining_energy_jobs(rem_energies,sim_case_str, nodes, s)
+    
+    sim_case_str = 'optimum C'
+    best_remaining_energies = run_simulation(s[0],s[1], args.sensors,sim_case_str, R=args.R, C=C, cache=cache, **deployment)
+    jobs += remaining_energy_jobs([best_remaining_energies, best_remaining_energies, best_remaining_energies],sim_case_str, nodes, s)
+    
+    sim_case_str = 'Fixed'
+    dead_counts , rem_energies, special_cycles, special_values, nodes, cluster_heads = run_fixed_head_simulation(s[0],s[1], args.sensors,R = args.R, trace=_trace(args, sim_case_str), cache=cache, **deployment)
+    jobs.append(figure_job(plot_dead_counts, f'{sim_case_str} - Active Counts.png', dead_counts,special_cycles,special_values,sim_case_str))
+    jobs += remaining_energy_jobs(rem_energies,sim_case_str, nodes + cluster_heads, s)
 
+    R_range = np.linspace(1, 30, 7)  # Test R values from 15m to 45m
+    results = lifetime_vs_R(s[0], s[1], args.sensors, R_range, cache, **deployment)
+    jobs.append(figure_job(plot_lifetime_vs_R, 'Lifetime vs R.png', results))
 
+    if args.out:
+        for path in render_figures(jobs, args.out, args.processes):
+            print(path)
+    else:
+        show_figures(jobs)
 
+if __name__ == "__main__":
+    main()
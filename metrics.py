@@ -0,0 +1,140 @@
+import numpy as np
+
+# Streaming metric collectors. The simulation engines hand every finished
+# stretch of rounds to each collector as
+#
+#     collector.on_span(start, dead_counts, energies_at)
+#
+# where `start` is the 0-based round the stretch begins at, `dead_counts`
+# holds one dead count per round and `energies_at(offsets)` returns the
+# energy vectors after rounds start + offset. The round loop passes one round
+# at a time; the skip-ahead engine passes whole spans and only rebuilds the
+# energies a collector actually asks for. Nothing here stores a full energy
+# vector per round. A collector with a true `done` attribute ends the run
+# after the span that set it (see stopped()).
+
+# Dead count at which each lifetime metric is reached, for N nodes
+TARGETS = {"T1": lambda N: 1, "T_half": lambda N: N / 2, "T_last": lambda N: N}
+
+
+class MilestoneCollector():
+    """Energies at the first, half and last node death, as run_simulation reports them.
+
+    For every target the round whose dead count is closest to it is kept
+    (the first such round on ties), with the energy vector snapshotted the
+    moment it becomes the best candidate.
+    """
+    def __init__(self, N):
+        self.targets = np.array([1, N / 2, N])
+        self.best = np.full(len(self.targets), np.inf)
+        self.cycles = np.zeros(len(self.targets), dtype=np.int64)
+        self.energies = [None] * len(self.targets)
+
+    def on_span(self, start, dead_counts, energies_at):
+        dist = np.abs(np.asarray(dead_counts)[:, None] - self.targets[None, :])
+        better = np.flatnonzero(dist.min(axis=0) < self.best)
+        if len(better) == 0:
+            return
+
+        offsets = np.argmin(dist[:, better], axis=0)
+        snapshots = energies_at(offsets)
+        for target, offset, energies in zip(better, offsets, snapshots):
+            self.best[target] = dist[offset, target]
+            self.cycles[target] = start + offset
+            self.energies[target] = np.array(energies)
+
+    @property
+    def special_cycles(self):
+        return self.cycles
+
+    @property
+    def special_energies(self):
+        return np.array(self.energies)
+
+
+class SnapshotCollector():
+    """Energy vector every `every` rounds (rounds 0, every, 2*every, ...)."""
+    def __init__(self, every):
+        self.every = every
+        self.rounds = []
+        self.energies = []
+
+    def on_span(self, start, dead_counts, energies_at):
+        first = -start % self.every
+        offsets = np.arange(first, len(dead_counts), self.every)
+        if len(offsets) == 0:
+            return
+        self.rounds.extend(start + offsets)
+        self.energies.extend(np.array(energies) for energies in energies_at(offsets))
+
+
+class AggregateCollector():
+    """Per-round scalar summaries: dead count, total, mean and min/max energy."""
+    def __init__(self):
+        self.dead_counts = []
+        self.total = []
+        self.mean = []
+        self.min = []
+        self.max = []
+
+    def on_span(self, start, dead_counts, energies_at):
+        energies = np.asarray(energies_at(np.arange(len(dead_counts))))
+        self.dead_counts.extend(dead_counts)
+        self.total.extend(energies.sum(axis=1))
+        self.mean.extend(energies.mean(axis=1))
+        self.min.extend(energies.min(axis=1))
+        self.max.extend(energies.max(axis=1))
+
+
+class HistogramCollector():
+    """Energy histogram every `every` rounds on fixed `bins` edges."""
+    def __init__(self, bins=np.linspace(0, 4, 41), every=1):
+        self.bins = np.asarray(bins)
+        self.every = every
+        self.rounds = []
+        self.counts = []
+
+    def on_span(self, start, dead_counts, energies_at):
+        first = -start % self.every
+        offsets = np.arange(first, len(dead_counts), self.every)
+        if len(offsets) == 0:
+            return
+        self.rounds.extend(start + offsets)
+        self.counts.extend(np.histogram(energies, self.bins)[0] for energies in energies_at(offsets))
+
+
+class EarlyStop():
+    """Ends a run as soon as `metric` is known, or once it ran past `max_rounds` rounds.
+
+    `metric` is one of TARGETS, or "lifetime" to only stop at max_rounds.
+    `value` is the 1-based round the metric was reached in (-1 until then);
+    `truncated` tells whether max_rounds cut the run before that.
+    """
+    def __init__(self, N, metric="T1", max_rounds=None):
+        self.target = TARGETS[metric](N) if metric != "lifetime" else None
+        self.max_rounds = max_rounds
+        self.value = -1
+        self.done = False
+        self.truncated = False
+
+    def on_span(self, start, dead_counts, energies_at):
+        if self.done:
+            return
+        if self.target is not None:
+            reached = np.flatnonzero(np.asarray(dead_counts) >= self.target)
+            if len(reached) > 0:
+                self.value = start + int(reached[0]) + 1
+                self.done = True
+                return
+        if self.max_rounds is not None and start + len(dead_counts) > self.max_rounds:
+            self.done = self.truncated = True
+
+
+def notify(collectors, start, dead_counts, energies_at):
+    for collector in collectors:
+        collector.on_span(start, dead_counts, energies_at)
+
+
+def stopped(collectors):
+    """Whether a collector asked to end the run."""
+    return any(getattr(collector, "done", False) for collector in collectors)
@@ -0,0 +1,115 @@
+import numpy as np
+from node import distance
+from grouping import as_groups
+from cost_cache import get_cost_cache
+from election import group_argmax, policy_keys
+from event_driven import advance_energy
+from simulation import generate_groups, generate_topology
+
+# Monte Carlo batches of rotating-head runs. Head elections are random, so a
+# single run_simulation gives one sample of T1 and friends. Here many
+# replicates of the same configuration share one topology and are stacked
+# along a leading array axis: energies are (replicates, nodes) and every
+# election and every span of C rounds advances all replicates at once.
+
+MILESTONES = ("T1", "T_half", "T_last")  # first, half and last node death
+
+
+def simulate_replicates(groups, sink_x, sink_y, C, n_replicates, seed=None, policy="uniform"):
+    """Run `n_replicates` independent rotations of the same groups in lockstep.
+
+    Replicates follow run_simulation's rules (election every C rounds, the run
+    ends after the round in which every group is dead) but draw their heads
+    from one np.random.Generator, with an election.POLICIES `policy`. Heads
+    send straight to the sink, there is no relay routing. Returns a dict of
+    arrays with one entry per replicate: the 1-based rounds of the
+    MILESTONES (-1 if never reached) and the "lifetime" in rounds.
+    """
+    rng = np.random.default_rng(seed)
+    groups = as_groups(groups)
+    state = groups.state
+    sizes = groups.sizes
+    bounds = groups.offsets
+    order = groups.members
+    label = groups.labels
+
+    x, y = state.x[order], state.y[order]
+    head_sink = get_cost_cache(state, sink_x, sink_y).head_sink[order]
+    B, N = n_replicates, len(order)
+
+    energy = np.tile(state.energy[order], (B, 1))
+    dead = np.tile(state.dead[order], (B, 1))
+    milestones = np.full((B, len(MILESTONES)), -1, dtype=np.int64)
+    targets = np.array([1, N / 2, N])
+    lifetime = np.zeros(B, dtype=np.int64)
+    running = np.ones(B, dtype=bool)
+    last_head = np.full((B, N), -np.inf)  # for the "leach" policy
+    rounds = 0
+    elections = 0
+
+    while running.any():
+        # Election for every group and replicate at once, a group without
+        # candidates sends everything to its last node
+        fresh = elections - last_head >= sizes[label] if policy == "leach" else None
+        pick = group_argmax(policy_keys(policy, rng, energy, energy >= head_sink * C, fresh), bounds)
+        group_alive = pick >= 0
+        head = np.where(group_alive, bounds[:-1] + pick, bounds[1:] - 1)
+
+        is_head = np.zeros((B, N), dtype=bool)
+        is_head[np.nonzero(group_alive)[0], head[group_alive]] = True
+        last_head[is_head] = elections
+        elections += 1
+        head_of = head[:, label]
+        cost = np.where(is_head, head_sink, state.model.transmit(distance(x, y, x[head_of], y[head_of]), order))
+
+        last = ~group_alive.any(axis=1)
+        span = np.where(last, 1, C)
+        active = (is_head | ~dead) & running[:, None]
+        new_energy, died = advance_energy(energy.ravel(), cost.ravel(), active.ravel(), np.repeat(span, N))
+        died = died.reshape(B, N)
+
+        # Per-round dead members over the span, as run_iteration counts them
+        counted = ~is_head & ~dead & (died > 0)
+        deaths = np.zeros((B, C + 1), dtype=np.int64)
+        np.add.at(deaths, (np.nonzero(counted)[0], died[counted] - 1), 1)
+        dead_counts = np.count_nonzero(dead & ~is_head, axis=1)[:, None] + np.cumsum(deaths[:, :C], axis=1)
+        in_span = np.arange(C)[None, :] < span[:, None]
+
+        for m, target in enumerate(targets):
+            reached = (dead_counts >= target) & in_span
+            new = running & (milestones[:, m] < 0) & reached.any(axis=1)
+            milestones[new, m] = rounds + np.argmax(reached[new], axis=1) + 1
+
+        energy = new_energy.reshape(B, N)
+        dead |= died > 0
+        lifetime[running] = rounds + span[running]
+        running &= ~last
+        rounds += C
+
+    results = {name: milestones[:, m] for m, name in enumerate(MILESTONES)}
+    results["lifetime"] = lifetime
+    return results
+
+
+def summarize(results, z=1.96):
+    """Mean, standard deviation and normal-approximation confidence interval per metric.
+
+    Replicates that never reached a milestone (-1) are left out of its statistics.
+    """
+    summary = {}
+    for name, values in results.items():
+        values = values[values >= 0].astype(float)
+        n = len(values)
+        mean = values.mean() if n else np.nan
+        std = values.std(ddof=1) if n > 1 else 0.0
+        half_width = z * std / np.sqrt(n) if n else np.nan
+        summary[name] = {"n": n, "mean": float(mean), "std": float(std),
+                         "ci_low": float(mean - half_width), "ci_high": float(mean + half_width)}
+    return summary
+
+
+def run_monte_carlo(sink_x, sink_y, N_sensors, C=5, n_cluster=5, n_replicates=200, seed=None, topology_seed=70, policy="uniform"):
+    """run_simulation's configuration replicated `n_replicates` times, summarized."""
+    nodes = generate_topology(N_sensors, kind="uniform", seed=topology_seed)
+    groups = generate_groups(nodes, n_cluster)
+    return summarize(simulate_replicates(groups, sink_x, sink_y, C, n_replicates, seed, policy))
@@ -1,3 +1,9 @@
+from collections.abc import Sequence
+from enum import IntEnum
+
+import numpy as np
+import kernels
+
 E_ELEC = 50e-9
 EPS_SHORT = 10e-9
 EPS_LONG = 0.0013e-9
@@ -7,124 +13,339 @@ E_agg = 50e-9
 d_0 = (EPS_SHORT/EPS_LONG)**0.5
 k = (PACKET_SIZE + OVERHEAD_SIZE) * 8  # Total #of Tx bits
 
+class Mode(IntEnum):
+    """Node modes as stored (int8) in NetworkState.mode."""
+    NODE = 0
+    HEAD = 1
+
+
+NODE_MODE = Mode.NODE
+HEAD_MODE = Mode.HEAD
+_MODE_NAMES = ("node", "head")
+
+
+def distance(x1, y1, x2, y2):
+    """Euclidean distance, works element-wise on arrays."""
+    return np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+
+
+def _at(coef, idx, shape):
+    # A scalar parameter, or the per-node values of the senders `idx`
+    if np.ndim(coef) == 0:
+        return coef
+    return np.broadcast_to(coef if idx is None else coef[idx], shape)
+
+
+class EnergyModel():
+    """First-order radio model with the module constants as defaults.
+
+    Any parameter can also be an array with one value per node of the
+    NetworkState using the model (heterogeneous networks); cost methods
+    then take the indices `idx` of the sending nodes. The per-packet
+    products are computed once here and the d_0 crossover is a mask over
+    whole arrays of links, so a cost call is a few array operations.
+    initial_energy is what a node starts with, head_initial_energy what a
+    permanent (fixed) head starts with.
+    """
+    def __init__(self, e_elec=E_ELEC, eps_short=EPS_SHORT, eps_long=EPS_LONG, packet_size=PACKET_SIZE,
+                 overhead_size=OVERHEAD_SIZE, e_agg=E_agg, initial_energy=2, head_initial_energy=4):
+        self.e_elec = e_elec
+        self.eps_short = eps_short
+        self.eps_long = eps_long
+        self.packet_size = packet_size
+        self.overhead_size = overhead_size
+        self.e_agg = e_agg
+        self.initial_energy = initial_energy
+        self.head_initial_energy = head_initial_energy
+
+        # Same parameters for every node, per-node costs then need no sender indices
+        self.uniform = all(np.ndim(value) == 0 for value in (e_elec, eps_short, eps_long, packet_size, overhead_size, e_agg))
+        self.d_0 = (np.asarray(eps_short) / eps_long)**0.5
+        self.k = (np.asarray(packet_size) + overhead_size) * 8  # bits per packet
+        self.k_elec = self.k * e_elec
+        self.k_short = self.k * eps_short
+        self.k_long = self.k * eps_long
+        self.k_agg = self.k * e_agg
+
+    def transmit(self, dist, idx=None):
+        """Tx energy over `dist` for the packets of nodes `idx` (Node.calculate_energy)."""
+        dist = np.asarray(dist, dtype=float)
+        elec, short, long, d_0 = (_at(c, idx, dist.shape) for c in (self.k_elec, self.k_short, self.k_long, self.d_0))
+        return elec + np.where(dist <= d_0, short * (dist**2), long * (dist**4))
+
+    def head(self, dist, idx=None):
+        """Rx + Tx + aggregation of a head (Node.calculate_energy_head)."""
+        dist = np.asarray(dist, dtype=float)
+        return _at(self.k_elec, idx, dist.shape) + self.transmit(dist, idx) + _at(self.k_agg, idx, dist.shape)
+
+    def receive(self, idx=None):
+        """Rx energy of one packet of nodes `idx`."""
+        return self.k_elec if idx is None or np.ndim(self.k_elec) == 0 else self.k_elec[idx]
+
+    def aggregate(self, idx=None):
+        return self.k_agg if idx is None or np.ndim(self.k_agg) == 0 else self.k_agg[idx]
+
+    def beyond_d_0(self, dist, idx=None):
+        dist = np.asarray(dist)
+        return dist > _at(self.d_0, idx, dist.shape)
+
+    def initial_energies(self, state):
+        """Starting energies of `state`'s nodes: heads already in HEAD mode get head_initial_energy."""
+        energy = np.broadcast_to(self.initial_energy, state.x.shape)
+        head = np.broadcast_to(self.head_initial_energy, state.x.shape)
+        return np.where(state.mode == HEAD_MODE, head, energy).astype(float)
+
+
+DEFAULT_MODEL = EnergyModel()
+
+
+def transmit_energy(dist):
+    """Vectorized version of Node.calculate_energy for an array of distances."""
+    return DEFAULT_MODEL.transmit(dist)
+
+
+def head_energy(dist):
+    """Vectorized version of Node.calculate_energy_head (Rx + Tx + aggregation)."""
+    return DEFAULT_MODEL.head(dist)
+
+
+def nearest_sink(x, y, sink_x, sink_y):
+    """Distance from each point to its nearest sink, and which sink that is.
+
+    The sink may be one position or arrays of several.
+    """
+    if np.ndim(sink_x) == 0:
+        dist = distance(x, y, sink_x, sink_y)
+        return dist, np.zeros(np.shape(dist), dtype=np.intp)
+    sink_x, sink_y = np.asarray(sink_x, dtype=float), np.asarray(sink_y, dtype=float)
+    dist = distance(np.expand_dims(x, -1), np.expand_dims(y, -1), sink_x, sink_y)
+    which = np.argmin(dist, axis=-1)
+    return np.take_along_axis(dist, np.expand_dims(which, -1), -1)[..., 0], which
+
+
+def dual_hop(dist, R):
+    """Vectorized Node.dual_hop: links longer than R go through a relay."""
+    return np.asarray(dist) > R
+
+
+class NetworkState():
+    """Structure-of-arrays storage for a whole network.
+
+    Positions, energies, dead flags and modes live in contiguous arrays so the
+    radio model can be applied to every node of a round in one batched pass.
+    Node objects are thin views into one of these.
+    """
+    def __init__(self, X, Y, energy=None, model=None):
+        self.x = np.array(X, dtype=float)
+        self.y = np.array(Y, dtype=float)
+        self.model = DEFAULT_MODEL if model is None else model
+        # A scalar, or one initial energy per node; the model's by default
+        energy = self.model.initial_energy if energy is None else energy
+        self.energy = np.array(np.broadcast_to(energy, self.x.shape), dtype=float)
+        self.dead = np.zeros(len(self.x), dtype=bool)
+        self.mode = np.full(len(self.x), NODE_MODE, dtype=np.int8)
+        # Bumped whenever a node moves or the model changes, see cost_cache.get_cost_cache
+        self.version = 0
+        self.cost_caches = {}
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getstate__(self):
+        # Cost caches are derived data, rebuild them after unpickling
+        state = self.__dict__.copy()
+        state["cost_caches"] = {}
+        return state
+
+    def nodes(self):
+        """All nodes, as a lazy Nodes sequence (no Node object per node is kept)."""
+        return Nodes(self, np.arange(len(self)))
+
+    def invalidate_costs(self):
+        self.version += 1
+        self.cost_caches.clear()
+
+    def set_model(self, model, reset_energy=True):
+        """Switch to another EnergyModel; all cached costs follow, nothing is rebuilt.
+
+        With reset_energy the nodes start over from the model's initial
+        energies (see EnergyModel.initial_energies).
+        """
+        self.model = model
+        self.invalidate_costs()
+        if reset_energy:
+            self.energy[:] = model.initial_energies(self)
+            self.dead[:] = False
+
+    def consume(self, idx, x_t, y_t):
+        """Batched Node.consume_energy: nodes `idx` transmit to (x_t, y_t).
+
+        The targets may be scalars or one target per index.
+        """
+        dist = distance(self.x[idx], self.y[idx], x_t, y_t)
+        is_head = self.mode[idx] == HEAD_MODE
+        cost = np.where(is_head, self.model.head(dist, idx), self.model.transmit(dist, idx))
+        self.spend(idx, cost, is_head)
+
+    def spend(self, idx, cost, is_head):
+        # Same rules as the per-node model: a node only pays while alive, a head
+        # always tries to pay, and whoever cannot afford the cost dies with its
+        # energy left untouched. Runs on the kernels backend, returns who died.
+        return kernels.spend(self.energy, self.dead, idx, cost, is_head)
+
+
+class Nodes(Sequence):
+    """Lazy sequence of Node views over indices of one NetworkState.
+
+    Stands in for a list of Node objects: indexing, slicing, iteration and
+    `+` work as on a list, but a Node view only exists while it is used, so a
+    network costs its state arrays plus one index per node.
+    """
+    __slots__ = ("state", "idx")
+
+    def __init__(self, state, idx):
+        self.state = state
+        self.idx = np.asarray(idx, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.idx)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Nodes(self.state, self.idx[i])
+        return Node._view(self.state, int(self.idx[i]))
+
+    def __iter__(self):
+        state = self.state
+        return (Node._view(state, i) for i in self.idx.tolist())
+
+    def __add__(self, other):
+        if isinstance(other, Nodes) and other.state is self.state:
+            return Nodes(self.state, np.concatenate([self.idx, other.idx]))
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+
+def gather_nodes(nodes):
+    """Return the NetworkState shared by `nodes` and their indices in it.
+
+    Nodes created one by one own separate states; those are merged into a new
+    state and the views re-pointed at it so later calls take the fast path.
+    """
+    if isinstance(nodes, Nodes):
+        return nodes.state, nodes.idx
+    nodes = list(nodes)
+    if len(nodes) == 0:
+        return NetworkState([], []), np.zeros(0, dtype=np.intp)
+
+    state = nodes[0]._state
+    if all(node._state is state for node in nodes):
+        return state, np.fromiter((node._idx for node in nodes), dtype=np.intp, count=len(nodes))
+
+    merged = NetworkState([node.x for node in nodes], [node.y for node in nodes], model=state.model)
+    merged.energy[:] = [node.energy for node in nodes]
+    merged.dead[:] = [node.isDead() for node in nodes]
+    merged.mode[:] = [node._state.mode[node._idx] for node in nodes]
+    for i, node in enumerate(nodes):
+        node._state = merged
+        node._idx = i
+    return merged, np.arange(len(nodes))
+
 
 class Node():
+    # A view is just (state, index), no per-instance dict
+    __slots__ = ("_state", "_idx")
+
     def __init__(self,x=0,y=0):
-        self._energy = 2
-        self._dead = False
-        self._x = x
-        self._y = y
-        self._MODE = "node"
+        self._state = NetworkState([x], [y])
+        self._idx = 0
+
+    @classmethod
+    def from_arrays(cls, X, Y, energy=None, model=None):
+        """A whole network from coordinate arrays, as a lazy Nodes sequence.
+
+        Initial energies default to the `model`'s (node.EnergyModel).
+        """
+        return NetworkState(X, Y, energy, model).nodes()
+
+    @classmethod
+    def _view(cls, state, idx):
+        node = cls.__new__(cls)
+        node._state = state
+        node._idx = idx
+        return node
 
     @property
     def x(self):
-        return self._x
-    
+        return self._state.x[self._idx]
+
     @x.setter
     def x(self, x1):
-        self._x = x1
+        self._state.x[self._idx] = x1
+        self._state.invalidate_costs()
 
     @property
     def y(self):
-        return self._y
-    
+        return self._state.y[self._idx]
+
     @y.setter
     def y(self, y1):
-        self._y = y1
-    
+        self._state.y[self._idx] = y1
+        self._state.invalidate_costs()
+
     @property
     def energy(self):
-        return self._energy
-    
+        return self._state.energy[self._idx]
+
     @energy.setter
     def energy(self, e):
-        self._energy = e 
+        self._state.energy[self._idx] = e
 
     @property
     def MODE(self):
-        return self._MODE
-    
+        return _MODE_NAMES[self._state.mode[self._idx]]
+
     @MODE.setter
     def MODE(self, m):
-        self._MODE = m
+        if isinstance(m, str):
+            m = NODE_MODE if m == "node" else HEAD_MODE
+        self._state.mode[self._idx] = m
 
 
     def get_position(self):
-        return self._x, self._y
-        
-  
-     
+        return self.x, self.y
+
+
+
     # Calculate d from this node to the sink
     def calculate_distance(self, x_s, y_s):
-        d = ((x_s - self.get_position()[0])**2 
-            + (y_s - self.get_position()[1])**2) **0.5
-        
-        return d
-    
-    
+        return distance(self.x, self.y, x_s, y_s)
+
+
     def calculate_energy(self,x_s,y_s):
-        dist = self.calculate_distance(x_s,y_s)
-        if dist <= d_0: # Short Distance
-            return (k * E_ELEC) + (k * EPS_SHORT * (dist**2))
-
-        return (k * E_ELEC) + (k * EPS_LONG  * (dist**4))
-    
-
-    def _consume_node(self, x_s, y_s):
-        if not self._dead:
-            E_tx = self.calculate_energy(x_s,y_s)
-            if self._energy - E_tx < 0:
-                self._dead = True
-                # print('I cannot communicate!')
-            else:
-                self._energy = self._energy - E_tx
-    
+        return self._state.model.transmit(self.calculate_distance(x_s,y_s), self._idx)[()]
+
     def calculate_energy_head(self, x_s, y_s):
-        E_rx = k*E_ELEC
-        E_tx = self.calculate_energy(x_s, y_s)
-        E_agg_total = k * E_agg
-        
-        E_total = E_rx + E_tx + E_agg_total
-        return E_total
-        
-    
-    def _consume_head(self, x_s, y_s):
-        
-        E_total = self.calculate_energy_head(x_s,y_s)
-
-        if self._energy - E_total < 0:
-                self._dead = True
-        else:
-            self._energy = self._energy - E_total
-        
-        
-    
+        return self._state.model.head(self.calculate_distance(x_s,y_s), self._idx)[()]
+
+
     def consume_energy(self, x_s, y_s):
-        if self._MODE == "node":
-            self._consume_node(x_s, y_s)
-        else:
-            self._consume_head(x_s, y_s)
-        
-        
-        
+        self._state.consume(np.array([self._idx]), x_s, y_s)
+
+
+
     def isDead(self):
-        return self._dead
-        
+        return bool(self._state.dead[self._idx])
+
     # Calculate distance to another node
     def distance_to_node(self, other):
-        d = ((other.get_position()[0] - self.get_position()[0])**2 
-            + (other.get_position()[1] - self.get_position()[1])**2) **0.5
-        
-        return d
-    
+        return distance(self.x, self.y, other.x, other.y)
+
     # Check if it needs dualihop..
     def dual_hop(self, x_s, y_s, R):
-        dist = self.calculate_distance(x_s,y_s)
-        if dist > R:
-            return True
-        return False
-    
-    def set_dead(self):
-        self._dead = True
-
+        return bool(dual_hop(self.calculate_distance(x_s,y_s), R))
 
+    def set_dead(self):
+        self._state.dead[self._idx] = True
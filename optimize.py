@@ -0,0 +1,123 @@
+import math
+
+from sweep import DEFAULTS, run_config
+
+# Tuning C (rotating heads) and R (fixed heads) without a full grid of
+# complete lifetimes. golden_section() brackets the best value of a unimodal
+# lifetime metric, and an Objective only simulates as far as a comparison
+# needs: a run stops the round its metric is reached (metrics.EarlyStop),
+# and a run that has already outlived the value it is compared with is cut
+# there, since all the search needs to know is that it wins. Every
+# evaluation uses the same topology and election seed, so two values of the
+# parameter are compared on the same network.
+
+PHI = (math.sqrt(5) - 1) / 2
+
+
+class Objective():
+    """A lifetime metric (sweep metric name, larger is better) as a function of one config key.
+
+    Exact values and lower bounds are memoized per parameter value; `runs`
+    and `rounds` count the simulations and rounds spent so far.
+    """
+    def __init__(self, name, config=None, metric="T1", engine="event", seed=0, topology_seed=70, kind="uniform"):
+        self.name = name
+        self.config = {**DEFAULTS, "seed": seed, **(config or {})}
+        self.metric = metric
+        self.engine = engine
+        self.topology_seed = topology_seed
+        self.kind = kind
+        self.exact = {}
+        self.lower = {}
+        self.runs = 0
+        self.rounds = 0
+
+    def _run(self, x, max_rounds=None):
+        row = run_config({**self.config, self.name: x}, self.topology_seed, self.kind, self.engine,
+                         None if self.metric == "lifetime" else self.metric, max_rounds)
+        self.runs += 1
+        self.rounds += row["lifetime"]
+        return row
+
+    def __call__(self, x):
+        """The metric at `x`."""
+        if x not in self.exact:
+            self.exact[x] = self._run(x)[self.metric]
+        return self.exact[x]
+
+    def beats(self, x, value):
+        """Whether the metric at `x` is larger than `value`, simulating at most value + 1 rounds."""
+        if x in self.exact:
+            return self.exact[x] > value
+        if self.lower.get(x, -math.inf) > value:
+            return True
+        if value < 1:
+            # Whether the metric is reached at all (-1 if not), only a full run tells
+            return self(x) > value
+        row = self._run(x, max_rounds=value)
+        if row["truncated"]:
+            self.lower[x] = value + 1
+            return True
+        self.exact[x] = row[self.metric]
+        return self.exact[x] > value
+
+
+def _at_least(objective, a, b):
+    """Whether objective(a) >= objective(b), running each only as far as needed."""
+    if a not in objective.exact:
+        if b in objective.exact:
+            return objective.beats(a, objective.exact[b] - 1)
+        # A point only known to outlive some round wins against any run that does not
+        if a in objective.lower and not objective.beats(b, objective.lower[a] - 1):
+            return True
+        if b in objective.lower and not objective.beats(a, objective.lower[b] - 1):
+            return False
+    return not objective.beats(b, objective(a))
+
+
+def golden_section(objective, low, high, integer=False, tol=1.0):
+    """Argmax of a unimodal `objective` over [low, high], by golden-section search.
+
+    With `integer` only whole values are tried and the last few of the
+    bracket are compared one by one; otherwise the search stops once the
+    bracket is narrower than `tol`.
+    """
+    point = (lambda t: int(round(t))) if integer else float
+    a, b = low, high
+    c, d = point(b - PHI * (b - a)), point(a + PHI * (b - a))
+    while b - a > (3 if integer else tol) and c < d:
+        if _at_least(objective, c, d):
+            b, d = d, c
+            c = point(b - PHI * (b - a))
+        else:
+            a, c = c, d
+            d = point(a + PHI * (b - a))
+
+    candidates = range(a, b + 1) if integer else [c, d]
+    best = candidates[0]
+    for x in candidates[1:]:
+        if not _at_least(objective, best, x):
+            best = x
+    return best
+
+
+def optimize_C(C_range=(2, 10), metric="T1", config=None, engine="event", seed=0, topology_seed=70, kind="uniform"):
+    """Election period C in C_range maximizing `metric` for rotating heads.
+
+    Returns (C, metric value, Objective); the Objective holds every value
+    that was evaluated and the simulation effort spent.
+    """
+    objective = Objective("C", {"mode": "rotation", **(config or {})}, metric, engine, seed, topology_seed, kind)
+    best = golden_section(objective, *C_range, integer=True)
+    return best, objective(best), objective
+
+
+def optimize_R(R_range=(1, 30), metric="lifetime", config=None, tol=0.5, engine="event", seed=0, topology_seed=70,
+               kind="uniform"):
+    """Fixed-head placement radius in R_range maximizing `metric` (to within `tol`).
+
+    Returns (R, metric value, Objective) like optimize_C.
+    """
+    objective = Objective("R", {"mode": "fixed", **(config or {})}, metric, engine, seed, topology_seed, kind)
+    best = golden_section(objective, *R_range, tol=tol)
+    return best, objective(best), objective
@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Figure rendering kept out of the simulation path. Plot functions take
+# `show` and `save_path` and end with finish_figure(); a figure job is a
+# (plot function, file name, args, kwargs) tuple that can be rendered later,
+# headless, in worker processes. matplotlib is only imported here when a
+# figure is actually finished or a backend is picked.
+
+HEADLESS_BACKEND = "Agg"
+
+
+def use_headless():
+    """Switch matplotlib to a non-interactive backend, plt.show() no longer blocks."""
+    import matplotlib
+    matplotlib.use(HEADLESS_BACKEND, force=True)
+
+
+def finish_figure(fig, show=True, save_path=None):
+    """Save and/or show a finished figure. Figures that are not shown are closed."""
+    import matplotlib.pyplot as plt
+    if save_path is not None:
+        os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+        fig.savefig(save_path)
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
+    return fig
+
+
+def figure_job(function, filename, *args, **kwargs):
+    """Describe a figure to render later: `function(*args, **kwargs)` saved as `filename`."""
+    return (function, filename, args, kwargs)
+
+
+def _render(job, out_dir):
+    function, filename, args, kwargs = job
+    path = os.path.join(out_dir, filename)
+    function(*args, show=False, save_path=path, **kwargs)
+    return path
+
+
+def render_figures(jobs, out_dir, processes=None):
+    """Render figure jobs headless into `out_dir`, in parallel worker processes.
+
+    processes=1 renders in this process (after switching it to the headless
+    backend). Returns the written paths in job order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if processes == 1:
+        use_headless()
+        return [_render(job, out_dir) for job in jobs]
+
+    with ProcessPoolExecutor(processes, initializer=use_headless) as pool:
+        return list(pool.map(_render, jobs, [out_dir] * len(jobs)))
+
+
+def show_figures(jobs):
+    """Interactive counterpart of render_figures: show the jobs one by one."""
+    for function, _, args, kwargs in jobs:
+        function(*args, show=True, **kwargs)
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from node import DEFAULT_MODEL, gather_nodes
+from topology import generate_positions
+from grouping import Groups, group_nodes
+
+# Content-addressed cache of deterministic results on disk: topologies,
+# groupings and result summaries. An entry is one compressed .npz named by
+# the SHA-256 of its key, the canonical JSON of everything the result depends
+# on (parameters, seeds, the radio model's constants, arrays by their hash).
+# Reads refresh an entry's mtime and the least recently used entries are
+# deleted once the directory outgrows max_bytes. Runs that depend on the
+# unseeded `random` module (elections without an election.Election) are
+# never cached.
+
+CACHE_VERSION = 1  # bump when the simulations change what a key computes
+
+
+def _encode(value):
+    if isinstance(value, np.ndarray):
+        return {"array": hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest(), "dtype": str(value.dtype),
+                "shape": value.shape}
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "initial_energy"):
+        return model_params(value)
+    raise TypeError(f"Cannot use {type(value).__name__} in a cache key")
+
+
+def model_params(model):
+    """The constants of a node.EnergyModel, as they go into cache keys."""
+    names = ("e_elec", "eps_short", "eps_long", "packet_size", "overhead_size", "e_agg", "initial_energy",
+             "head_initial_energy")
+    return {name: np.asarray(getattr(model, name)) if np.ndim(getattr(model, name)) else getattr(model, name)
+            for name in names}
+
+
+def cache_key(kind, **params):
+    """Hex digest naming the result `kind` computed from `params`."""
+    params = {"kind": kind, "version": CACHE_VERSION, **params}
+    text = json.dumps(params, sort_keys=True, default=_encode)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache():
+    """Arrays on disk under `directory`, keyed by cache_key(), at most `max_bytes` in total."""
+    def __init__(self, directory, max_bytes=256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """The arrays stored under `key` (a dict), or None."""
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            os.utime(path)  # most recently used
+        except FileNotFoundError:
+            pass  # evicted by another process meanwhile, the arrays are still good
+        return arrays
+
+    def put(self, key, **arrays):
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"  # workers may write the same key at once
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+        self.evict()
+
+    def cached(self, kind, compute, **params):
+        """compute() (a dict of arrays) for these `params`, from disk when it was computed before."""
+        key = cache_key(kind, **params)
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, **arrays)
+        return arrays
+
+    def entries(self):
+        """(mtime, size, path) of every entry, least recently used first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz") and not entry.name.endswith(".tmp.npz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # sweep workers share the cache and evict concurrently
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # another process removed it first
+
+
+def as_cache(cache):
+    """A ResultCache for a cache or a directory (None stays None)."""
+    if cache is None or isinstance(cache, ResultCache):
+        return cache
+    return ResultCache(cache)
+
+
+def cached_positions(cache, N, kind="uniform", x1=0, x2=100, y1=0, y2=100, seed=None, **kwargs):
+    """topology.generate_positions through `cache`; unseeded deployments are not cached."""
+    cache = as_cache(cache)
+    if cache is None or seed is None:
+        return generate_positions(N, kind, x1, x2, y1, y2, seed=seed, **kwargs)
+    arrays = cache.cached("positions", lambda: dict(zip("XY", generate_positions(N, kind, x1, x2, y1, y2, seed=seed, **kwargs))),
+                          N=N, deployment=kind, area=(x1, x2, y1, y2), seed=seed, options=kwargs)
+    return arrays["X"], arrays["Y"]
+
+
+def cached_groups(cache, nodes, n_groups, strategy="sector", **kwargs):
+    """grouping.group_nodes through `cache`, keyed by the positions of `nodes`."""
+    cache = as_cache(cache)
+    if cache is None:
+        return group_nodes(nodes, n_groups, strategy, **kwargs)
+    state, idx = nodes if isinstance(nodes, tuple) else gather_nodes(nodes)
+
+    def compute():
+        groups = group_nodes((state, idx), n_groups, strategy, **kwargs)
+        return {"members": groups.members, "labels": groups.labels}
+
+    arrays = cache.cached("groups", compute, x=state.x[idx], y=state.y[idx], idx=idx, n_groups=n_groups,
+                          strategy=strategy, options=kwargs)
+    return Groups(state, arrays["members"], arrays["labels"], n_groups, strategy, kwargs)
+
+
+def cached_summary(cache, kind, compute, **params):
+    """A dict of plain values (a result row) through `cache`, stored as JSON.
+
+    The default radio model goes into the key unless `params` name a model.
+    """
+    cache = as_cache(cache)
+    if cache is None:
+        return compute()
+    params.setdefault("model", DEFAULT_MODEL)
+    arrays = cache.cached(kind, lambda: {"summary": np.array(json.dumps(compute()))}, **params)
+    return json.loads(str(arrays["summary"]))
@@ -0,0 +1,181 @@
+import numpy as np
+from node import DEFAULT_MODEL, distance, dual_hop, nearest_sink
+from cost_cache import sink_key
+
+# Relay routing for cluster heads. By default every head sends its aggregate
+# straight to the sink, which gets expensive fast past d_0 (d^4 model). A
+# Router lets far heads (dual_hop past R, or past d_0) hand their packet to a
+# relay closer to the sink instead:
+#
+#   "heads"     multi-hop tree over the elected heads. A relay head receives
+#               and aggregates the packet into its own, so it pays Rx +
+#               aggregation per child and still sends one packet.
+#   "dual_hop"  one intermediate sensor between a far head and the sink. The
+#               relay receives and forwards the packet as is, Rx + Tx to the
+#               sink per packet, on top of its own traffic.
+#
+# A far head keeps the direct link when no relay makes the round cheaper
+# overall; with several sinks, heads and relays send to their nearest one.
+# Routes only depend on who the heads are and where the sinks are, so they
+# are built once per election (or head death, or sink move) and reused every
+# round after that; a relay that dies in between simply stops paying until
+# the next rebuild. Costs come from an EnergyModel, per packet of the head
+# that sent it.
+
+RELAYS = ("heads", "dual_hop")
+
+
+def relay_needed(dist, R, model=DEFAULT_MODEL, idx=None):
+    """Links that should be relayed: dual_hop beyond R, or past the d_0 crossover."""
+    return dual_hop(dist, R) | model.beyond_d_0(dist, idx)
+
+
+def head_routes(x, y, sink_x, sink_y, R, model=DEFAULT_MODEL, idx=None):
+    """Next hop of every head in a multi-hop tree over the heads.
+
+    Far heads pick, among heads strictly closer to the sink (so the tree has
+    no cycles), the one that adds the least energy per round, unless sending
+    directly is cheaper. `idx` are the heads' state indices for per-node
+    models. Returns next hops (head positions, -1 for the sink).
+    """
+    idx = np.arange(len(x)) if idx is None else idx
+    to_sink, _ = nearest_sink(x, y, sink_x, sink_y)
+    next_hop = np.full(len(x), -1, dtype=np.intp)
+    far = np.flatnonzero(relay_needed(to_sink, R, model, idx))
+    if len(far) == 0:
+        return next_hop
+
+    sender = idx[far, None]
+    via = model.transmit(distance(x[far, None], y[far, None], x[None, :], y[None, :]), sender)
+    via = via + (model.receive(sender) + model.aggregate(sender))
+    via = np.where(to_sink[None, :] < to_sink[far, None], via, np.inf)
+    best = np.argmin(via, axis=1)
+    better = via[np.arange(len(far)), best] < model.transmit(to_sink[far], idx[far])
+    next_hop[far[better]] = best[better]
+    return next_hop
+
+
+def sensor_relays(x, y, relay_x, relay_y, sink_x, sink_y, R, model=DEFAULT_MODEL, idx=None):
+    """Best single relay sensor of every head, as positions into relay_x/relay_y (-1 for direct)."""
+    idx = np.arange(len(x)) if idx is None else idx
+    to_sink, _ = nearest_sink(x, y, sink_x, sink_y)
+    relay_dist, _ = nearest_sink(relay_x, relay_y, sink_x, sink_y)
+    relay = np.full(len(x), -1, dtype=np.intp)
+    if len(relay_x) == 0:
+        return relay
+
+    # The relay receives and forwards the head's packet
+    relay_sink = model.transmit(relay_dist) + model.receive() if model.uniform else None
+    for h in np.flatnonzero(relay_needed(to_sink, R, model, idx)):
+        if not model.uniform:
+            relay_sink = model.transmit(relay_dist, idx[h]) + model.receive(idx[h])
+        via = model.transmit(distance(x[h], y[h], relay_x, relay_y), idx[h]) + relay_sink
+        best = int(np.argmin(via))
+        if via[best] < model.transmit(to_sink[h], idx[h]):
+            relay[h] = best
+    return relay
+
+
+def _nearest_sink_position(x, y, sink_x, sink_y):
+    if np.ndim(sink_x) == 0:
+        return np.full(len(x), float(sink_x)), np.full(len(x), float(sink_y))
+    _, which = nearest_sink(x, y, sink_x, sink_y)
+    return np.asarray(sink_x, dtype=float)[which], np.asarray(sink_y, dtype=float)[which]
+
+
+class Router():
+    """Route table of the current heads and the per-round costs it implies.
+
+    costs() is called every round but only rebuilds when the set of heads
+    changes, i.e. once per election.
+    """
+    def __init__(self, R=25, relay="heads"):
+        if relay not in RELAYS:
+            raise ValueError(f"Unknown relay mode '{relay}', choose from {RELAYS}")
+        self.R = R
+        self.relay = relay
+        self._key = None
+        self._costs = None
+
+    def costs(self, state, order, is_head, sink_x, sink_y):
+        """Per-round costs under the routes: (head_cost, relay_pos, relay_cost).
+
+        head_cost replaces the direct Rx + aggregation + Tx cost of the heads
+        order[is_head]; relay sensors at positions relay_pos of `order` pay
+        relay_cost on top of their own traffic.
+        """
+        heads = order[is_head]
+        key = (id(state), state.version, sink_key(sink_x, sink_y), heads.tobytes())
+        if key != self._key:
+            self._key = key
+            self._costs = self._build(state, order, is_head, sink_x, sink_y)
+        head_cost, relays, relay_cost = self._costs
+        if len(relays) == 0:
+            return head_cost, np.zeros(0, dtype=np.intp), relay_cost
+        # Relays are kept as nodes: `order` may have dropped the ones that died since
+        relay_pos = np.flatnonzero(np.isin(order, relays))
+        return head_cost, relay_pos, relay_cost[np.searchsorted(relays, order[relay_pos])]
+
+    def _build(self, state, order, is_head, sink_x, sink_y):
+        model = state.model
+        heads = order[is_head]
+        x, y = state.x[heads], state.y[heads]
+        # Without a relay a head sends to its nearest sink
+        hop_x, hop_y = _nearest_sink_position(x, y, sink_x, sink_y)
+
+        if self.relay == "heads":
+            next_hop = head_routes(x, y, sink_x, sink_y, self.R, model, heads)
+            routed = next_hop >= 0
+            hop_x[routed], hop_y[routed] = x[next_hop[routed]], y[next_hop[routed]]
+            # A relay head receives and aggregates one packet per child
+            child = heads[routed]
+            if model.uniform:
+                children = np.bincount(next_hop[routed], minlength=len(heads)) * (model.receive() + model.aggregate())
+            else:
+                children = np.bincount(next_hop[routed], weights=model.receive(child) + model.aggregate(child), minlength=len(heads))
+            head_cost = model.head(distance(x, y, hop_x, hop_y), heads) + children
+            return head_cost, np.zeros(0, dtype=np.intp), np.zeros(0)
+
+        candidates = np.flatnonzero(~is_head & ~state.dead[order])
+        relay_x, relay_y = state.x[order[candidates]], state.y[order[candidates]]
+        relay = sensor_relays(x, y, relay_x, relay_y, sink_x, sink_y, self.R, model, heads)
+        routed = relay >= 0
+        hop_x[routed], hop_y[routed] = relay_x[relay[routed]], relay_y[relay[routed]]
+        head_cost = model.head(distance(x, y, hop_x, hop_y), heads)
+
+        # One forwarded packet per head using the relay
+        relay_of = candidates[relay[routed]]
+        relay_pos, slot, packets = np.unique(relay_of, return_inverse=True, return_counts=True)
+        if model.uniform:
+            relay_dist, _ = nearest_sink(state.x[order[relay_pos]], state.y[order[relay_pos]], sink_x, sink_y)
+            relay_cost = packets * (model.receive() + model.transmit(relay_dist))
+        else:
+            sender = heads[routed]
+            relay_dist, _ = nearest_sink(state.x[order[relay_of]], state.y[order[relay_of]], sink_x, sink_y)
+            forward = model.receive(sender) + model.transmit(relay_dist, sender)
+            relay_cost = np.bincount(slot, weights=forward, minlength=len(relay_pos))
+        relays = order[relay_pos]
+        by_node = np.argsort(relays)
+        return head_cost, relays[by_node], relay_cost[by_node]
+
+
+def make_router(routing, R):
+    """Router for a `routing` argument: None/"direct", a RELAYS mode using R, or a Router."""
+    if routing is None or routing == "direct":
+        return None
+    if isinstance(routing, Router):
+        return routing
+    return Router(R, routing)
+
+
+def state_router(state, routing, R):
+    """make_router for callers that go round by round: a RELAYS mode gets one
+    Router per state and R, kept among the state's cost caches, so its routes
+    are only rebuilt when the heads change."""
+    if routing is None or routing == "direct" or isinstance(routing, Router):
+        return make_router(routing, R)
+    key = f"router {routing} {R}"
+    router = state.cost_caches.get(key)
+    if router is None:
+        router = state.cost_caches[key] = Router(R, routing)
+    return router
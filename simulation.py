@@ -1,49 +1,56 @@
-from node import Node
+from node import NetworkState, HEAD_MODE
+from cost_cache import get_cost_cache, sink_key
 import numpy as np 
-import matplotlib.pyplot as plt
-import pickle
 import random
-
-def generate_topology(N, x1=0, x2=100, y1=0, y2=100, center=(50,50)):
-    np.random.seed(70)
-    potential_points = N**2
-    X = np.linspace(x1, x2, potential_points)
-    Y = np.linspace(y1, y2, potential_points)
-    
-    ind_x = np.random.choice(potential_points, size=N, replace=False)
-    ind_y = np.random.choice(potential_points, size=N, replace=False)
-
-    X = X[ind_x]
-    Y = Y[ind_y]
+from grouping import as_groups, group_nodes
+from metrics import MilestoneCollector, notify, stopped
+from energy_trace import Trace, TraceWriter
+from routing import make_router, state_router
+from rendering import finish_figure
+from active_set import ActiveSet, LiveGroups
+from result_cache import cached_groups, cached_positions
+
+# What members of a dead group (no member can afford to be head) do:
+# "last" report to the group's last node as if it were the head, which is
+# what the original loop did and keeps earlier results reproducible, "sink"
+# send straight to the sink, "idle" stop sending.
+DEAD_GROUPS = ("last", "sink", "idle")
+
+def generate_topology(N, x1=0, x2=100, y1=0, y2=100, center=(50,50), kind="legacy", seed=70, cache=None):
+    """Nodes of a fresh network deployed as topology.DEPLOYMENTS[kind].
+
+    The default "legacy" lattice reproduces the original figures but is
+    quadratic in N; large networks should use "uniform" or another kind.
+    With a `cache` (result_cache) the positions are only generated once.
+    """
+    X, Y = cached_positions(cache, N, kind, x1, x2, y1, y2, seed=seed)
     
-    nodes = [Node(X[i], Y[i]) for i in range(len(X))]
+    nodes = NetworkState(X, Y).nodes()
     
     return nodes
 
-def generate_groups(nodes, n_cluster, center=(50,50)):
-
-    center_x, center_y = center
-    angles = np.arctan2([node.y - center_y for node in nodes], [node.x - center_x for node in nodes])
-    angles = (angles + 2 * np.pi) % (2 * np.pi) 
-    
-    sectors = np.linspace(0, 2 * np.pi, n_cluster + 1)
-    groups = {i: [] for i in range(n_cluster)}
-    for i, angle in enumerate(angles):
-        for j in range(n_cluster):
-            if sectors[j] <= angle < sectors[j + 1]:
-                groups[j].append(nodes[i])
-                break
-
-    return groups
-
-def graph_topology(nodes, sink_x, sink_y,sim_case, energies = None, cycle=None):
+def generate_groups(nodes, n_cluster, center=(50,50), strategy="sector", cache=None, **kwargs):
+    """Split `nodes` into n_cluster groups, angular sectors around `center` by default.
+
+    Other strategies from grouping.STRATEGIES ("grid", "kmeans",
+    "nearest_head") take their own keyword arguments. A `cache`
+    (result_cache) keeps the grouping of these positions on disk.
+    """
+    if strategy == "sector":
+        kwargs["center"] = center
+    if cache is not None:
+        return cached_groups(cache, nodes, n_cluster, strategy, **kwargs)
+    return group_nodes(nodes, n_cluster, strategy, **kwargs)
+
+def graph_topology(nodes, sink_x, sink_y,sim_case, energies = None, cycle=None, show=True, save_path=None):
+    import matplotlib.pyplot as plt
     X_coords = [node.x for node in nodes]
     y_coords = [node.y for node in nodes]
     
     fig = plt.figure(figsize=(10,10))
     if energies is not None:
         # plt.figure(figsize=(10, 8))
-        scatter = plt.scatter(X_coords, y_coords, c=energies, cmap='viridis', s=100, edgecolor='k')
+        scatter = plt.scatter(X_coords, y_coords, c=np.asarray(energies), cmap='viridis', s=100, edgecolor='k')
         cbar = plt.colorbar(scatter)
         cbar.set_label('Energy')
     else:
@@ -65,20 +72,18 @@ def graph_topology(nodes, sink_x, sink_y,sim_case, energies = None, cycle=None):
     plt.xlabel('X position (m)')
     plt.ylabel('Y position (m)')
     plt.legend()
-    plt.show()
-    # fig.savefig(f'Figures//{sim_case}//{title}.jpg')
+    return finish_figure(fig, show, save_path)
 
-    # with open(f'Figures//{sim_case}//{title}.fig', 'wb') as fig_file:
-    #     pickle.dump(fig, fig_file)
-
-def graph_groups(groups,center,C):
+def graph_groups(groups,center,C, show=True, save_path=None):
+    import matplotlib.pyplot as plt
     colors = ['red', 'blue', 'green', 'purple', 'orange']
-    plt.figure(figsize=(10, 10))
+    fig = plt.figure(figsize=(10, 10))
     center_x, center_y = center
 
-    for group_id, cluster_nodes in groups.items():
-        x_coords = [node.x for node in cluster_nodes]
-        y_coords = [node.y for node in cluster_nodes]
+    groups = as_groups(groups)
+    for group_id in groups:
+        x_coords = groups.state.x[groups.indices(group_id)]
+        y_coords = groups.state.y[groups.indices(group_id)]
         plt.scatter(x_coords, y_coords, color=colors[group_id], label=f'Group {group_id}')
 
     angles = np.linspace(0, 2 * np.pi, C + 1)
@@ -96,54 +101,110 @@ def graph_groups(groups,center,C):
     plt.ylim(0, 100)
     plt.grid(alpha=0.5)
     plt.axis('equal')
-    plt.show()
-
-
-def elect_cluster_head(groups,x_s,y_s, C)->list:
+    return finish_figure(fig, show, save_path)
+
+
+def elect_cluster_head(groups,x_s,y_s, C, election=None, live=None)->list:
+    """One head per group among the members that can afford C rounds as head.
+
+    Without an `election` every group picks uniformly with the `random`
+    module, as always; an election.Election elects all groups in one batch
+    with its own Generator and policy. Dead groups get -1, the loops report
+    them to hooks through on_election (see hooks.DeadGroups). The loops pass
+    the same active_set.LiveGroups `live` to every election, so the members
+    that died and can no longer be elected are not visited again.
+    """
+    groups = as_groups(groups)
+    live = LiveGroups(groups) if live is None else live
+    if election is not None:
+        return election.elect(groups, x_s, y_s, C, live)
+
+    live.update(x_s, y_s, C)
+    state = groups.state
     elected_heads = []
-    for group_idx, group in enumerate(list(groups.values())):
-        group_candidates = []
-        for i, node in enumerate(group):
-            node.MODE = "node"
-            if node.energy >= node.calculate_energy_head(x_s,y_s)*C:
-                group_candidates.append(i)
+    for group_idx in groups:
+        start = live.offsets[group_idx]
+        # The candidates keep their order, so random.choice picks the node it would among the whole group
+        group_candidates = np.flatnonzero(live.eligible[start:live.offsets[group_idx + 1]])
         
         if len(group_candidates) == 0:
-            print(f"Group {group_idx} is dead")
             elected_heads.append(-1)
         else:
-            cluster_head_idx = random.choice(group_candidates)
-            group[cluster_head_idx].MODE = "head"
-            elected_heads.append(cluster_head_idx)
+            cluster_head_idx = start + int(random.choice(group_candidates))
+            state.mode[live.members[cluster_head_idx]] = HEAD_MODE
+            elected_heads.append(int(live.in_group[cluster_head_idx]))
                             
     return elected_heads
 
-def run_iteration(groups, elected_heads, sink_x, sink_y, R=25):
-    dead_count = 0
-    remaining_energies = {}
-    
-    for idx, group in enumerate(list(groups.values())):
-        elected_head_idx = elected_heads[idx]
-        elected_head_node = group[elected_head_idx]
-        remaining_energies_group = []
-        for node in group:
-            if node.MODE == "node":
-                node.consume_energy(elected_head_node.x, elected_head_node.y)
-                if node.isDead():
-                    dead_count += 1
-
-            else:
-                node.consume_energy(sink_x, sink_y)
-            
-            remaining_energies_group.append(node.energy)
-        
-        remaining_energies[idx] = remaining_energies_group
-
-    rem_energies = [item for val in remaining_energies.values() for item in val]
+def round_costs(groups, elected_heads, sink_x, sink_y, router=None, dead_group="last", live=None):
+    """Energy every node spends in one round under the current election.
+
+    Members pay their (cached) Tx cost to the group's head, heads pay
+    Rx + aggregation + Tx to the sink, or to their next hop when a
+    routing.Router relays them. Members of dead groups (head -1) follow
+    `dead_group`, see DEAD_GROUPS. Returns (state, order, cost, is_head)
+    with `order` the node indices group after group, only those of
+    `live` (the LiveGroups of the last election) if given.
+    """
+    groups = as_groups(groups)
+    state = groups.state
+    costs = get_cost_cache(state, sink_x, sink_y)
+
+    order, offsets = (groups.members, groups.offsets) if live is None else (live.members, live.offsets)
+    cost = np.empty(len(order))
+    for group_idx in groups:
+        idx = order[offsets[group_idx]:offsets[group_idx + 1]]
+        if len(idx) == 0:
+            continue
+        group_cost = cost[offsets[group_idx]:offsets[group_idx + 1]]
+        head = elected_heads[group_idx]
+        if head >= 0:
+            group_cost[:] = costs.member_costs(groups.indices(group_idx)[head], idx, group_idx)
+        elif dead_group == "last":
+            group_cost[:] = costs.member_costs(groups.indices(group_idx)[-1], idx, group_idx)
+        elif dead_group == "sink":
+            group_cost[:] = costs.node_sink[idx]
+        else:
+            group_cost[:] = 0
+
+    is_head = state.mode[order] == HEAD_MODE
+    cost[is_head] = costs.head_costs(order[is_head])
+    if router is not None:
+        head_cost, relay_pos, relay_cost = router.costs(state, order, is_head, sink_x, sink_y)
+        cost[is_head] = head_cost
+        cost[relay_pos] += relay_cost
+
+    return state, order, cost, is_head
+
+def run_iteration(groups, elected_heads, sink_x, sink_y, R=25, routing=None, hooks=None, iter=0, dead_group="last"):
+    """One round; heads past R relay when `routing` is a routing.RELAYS mode or a Router.
+
+    A RELAYS mode uses one Router per network and R (routing.state_router),
+    so calling this round after round rebuilds the routes only after an
+    election. `hooks` (hooks.Hooks) get the phase timings and the deaths of
+    round `iter`. A single round over every node; simulate_rotation steps an
+    ActiveSet instead.
+    """
+    router = state_router(as_groups(groups).state, routing, R)
+    state, order, cost, is_head = round_costs(groups, elected_heads, sink_x, sink_y, router, dead_group)
+    if hooks is not None:
+        hooks.lap("routing")
+        was_dead = state.dead[order] if hooks.wants_deaths else None
+
+    state.spend(order, cost, is_head)
+    if hooks is not None:
+        hooks.lap("energy_update")
+
+    dead_count = int(np.count_nonzero(state.dead[order] & ~is_head))
+    rem_energies = state.energy[order].copy()
+    if hooks is not None:
+        hooks.lap("metrics")
+        if hooks.wants_deaths:
+            hooks.deaths(iter, order, state.dead[order] & ~was_dead, is_head)
 
     return dead_count, rem_energies
 
-def get_T1_C(nodes, sink_x, sink_y, C_range):
+def get_T1_C(nodes, sink_x, sink_y, C_range, cache=None, kind="legacy", seed=70):
 
     T1_list = [] 
     max_T1 = -1  
@@ -155,8 +216,8 @@ def get_T1_C(nodes, sink_x, sink_y, C_range):
         iter = 0
         dead_count = 0
         remaining_energies = []
-        nodes = generate_topology(100)
-        groups = generate_groups(nodes, n_clusters)
+        nodes = generate_topology(100, kind=kind, seed=seed, cache=cache)
+        groups = generate_groups(nodes, n_clusters, cache=cache)
 
         while True:
             if iter % C == 0:
@@ -176,61 +237,149 @@ def get_T1_C(nodes, sink_x, sink_y, C_range):
                 break
     return best_C, max_T1, T1_list, best_remaining_energies
 
-def run_simulation(sink_x, sink_y, N_sensors,sim_case, R, C=5, n_cluster = 5):
-    
-    nodes = generate_topology(N_sensors)
-    groups = generate_groups(nodes, n_cluster)
+def simulate_rotation(groups, sink_x, sink_y, C, R=25, engine="round", collectors=(), election=None, routing=None, hooks=None,
+                      checkpoints=None, resume=None, model=None, sink_path=None, dead_group="last"):
+    """Run rotating-head LEACH on prepared groups until every group is dead.
+
+    Returns the per-round dead counts. Anything else (energies at milestones,
+    snapshots, aggregates) is recorded by the `collectors`, see metrics.py;
+    a collector can also end the run early (metrics.EarlyStop).
+    `engine` is "round" for the round by round loop or "event" for the
+    skip-ahead engine; `election` is passed on to elect_cluster_head.
+    With `routing` ("heads" or "dual_hop", see routing.py) heads further than
+    R from the sink relay their data. `hooks` (hooks.Hooks) observe rounds,
+    elections and deaths and time the loop phases. A checkpoint.Checkpointer
+    saves the run every so many rounds; `resume` (a checkpoint.Checkpoint)
+    continues from one, see checkpoint.resume(). A node.EnergyModel `model`
+    replaces the network's radio model and initial energies before the run.
+    sink_x, sink_y may be arrays of several sinks, heads then report to the
+    nearest; a sinks.SinkPath `sink_path` moves the sink(s) round by round.
+    `dead_group` decides what members of dead groups do, see DEAD_GROUPS.
+
+    Between elections and sink moves the round loop only visits the nodes
+    that still pay (active_set.ActiveSet), so late rounds with most nodes
+    dead cost little.
+    """
+    if dead_group not in DEAD_GROUPS:
+        raise ValueError(f"Unknown dead group handling '{dead_group}', choose from {DEAD_GROUPS}")
+    if model is not None:
+        as_groups(groups).state.set_model(model)
+    router = make_router(routing, R)
+    if engine == "event":
+        # Skip-ahead engine, same results without stepping every round
+        from event_driven import run_rotation_events
+        return run_rotation_events(groups, sink_x, sink_y, C, R, collectors, election, router, hooks, checkpoints, resume,
+                                   sink_path, dead_group)
+
+    dead_counts = []
+    iter = 0
+    elect_cluster_heads = []
+    if resume is not None:
+        dead_counts = list(resume.dead_counts)
+        iter = resume.rounds
+        elect_cluster_heads = list(resume.elected_heads)
+        random.setstate(resume.random_state)
+    live = LiveGroups(as_groups(groups))
+    active = None
+    while True:
+        if sink_path is not None:
+            position = sink_path.at(iter)
+            if active is not None and sink_key(*position) != sink_key(sink_x, sink_y):
+                active = None  # the heads' (and relays') costs change with the sink
+            sink_x, sink_y = position
+        if hooks is not None:
+            hooks.emit("on_round_start", iter)
+            hooks.start()
+        if iter % C == 0:
+            elect_cluster_heads = elect_cluster_head(groups, sink_x, sink_y, C, election, live)
+            active = None
+            if hooks is not None:
+                hooks.lap("election")
+                hooks.emit("on_election", iter, groups, elect_cluster_heads)
+                hooks.start()
+
+        if active is None:
+            state, order, cost, is_head = round_costs(groups, elect_cluster_heads, sink_x, sink_y, router, dead_group, live)
+            # Members left out of `live` are all dead and none of them is head
+            active = ActiveSet(state, order, cost, is_head, ~is_head, base=live.dropped, reported=live.groups.members)
+        if hooks is not None:
+            hooks.lap("routing")
+        dead_count = active.step(hooks, iter)
+        if hooks is not None:
+            hooks.lap("energy_update")
+        dead_counts.append(dead_count)
+        notify(collectors, iter, [dead_count], lambda offsets: [active.energies()] * len(offsets))
+        if hooks is not None:
+            hooks.lap("metrics")
+            hooks.emit("on_round_end", iter, dead_count)
+
+        if elect_cluster_heads.count(-1) == len(groups) or stopped(collectors):
+            break
 
-    graph_topology(nodes, 50, 50,'', energies = None, cycle=None)
-    graph_groups(groups,(sink_x,sink_y), n_cluster)
+        iter += 1
+        if checkpoints is not None and checkpoints.due(iter):
+            checkpoints.save_rotation(iter, groups, elect_cluster_heads, dead_counts, sink_x, sink_y, C, R, collectors, election,
+                                      router, sink_path, dead_group)
+
+    return np.array(dead_counts)
+
+def plot_T1_vs_C(C_range, T1_list, show=True, save_path=None):
+    import matplotlib.pyplot as plt
+    # Plot C_range vs. T1_list
+    fig = plt.figure(figsize=(8, 6))
+    plt.plot(C_range, T1_list, marker='o', linestyle='-', color='b', label='T1 values')
+    # Labels and Title
+    plt.title("C Range vs T1 Values", fontsize=14)
+    plt.xlabel("C (number of cycles)", fontsize=12)
+    plt.ylabel("T1 (Iteration when first node dies)", fontsize=12)
+    plt.grid(alpha=0.5)
+    plt.legend(fontsize=10)
+    plt.xticks(C_range)
+    plt.tight_layout()
+
+    return finish_figure(fig, show, save_path)
+
+def run_simulation(sink_x, sink_y, N_sensors,sim_case, R, C=5, n_cluster = 5, engine="round", plot=False, election=None, routing=None, hooks=None,
+                   trace=None, cache=None, kind="legacy", seed=70):
+    """Rotating-head run; with a `trace` (path or energy_trace.TraceWriter) every
+    round's energies go to disk and the milestone energies are read back lazily.
+    A `cache` (result_cache) keeps the topology and groups; the elections use
+    the unseeded `random` module, so the runs themselves are not cached.
+    `kind` and `seed` choose the deployment, see generate_topology."""
+
+    nodes = generate_topology(N_sensors, kind=kind, seed=seed, cache=cache)
+    groups = generate_groups(nodes, n_cluster, cache=cache)
+
+    if plot:
+        graph_topology(nodes, sink_x, sink_y,'', energies = None, cycle=None)
+        graph_groups(groups,(sink_x,sink_y), n_cluster)
 
     C_range = range(2,11,1) 
 
     if sim_case == 'optimum C':
-        best_C, max_T1, T1_list, best_remaining_energies = get_T1_C(nodes, sink_x, sink_y, C_range)
+        best_C, max_T1, T1_list, best_remaining_energies = get_T1_C(nodes, sink_x, sink_y, C_range, cache, kind, seed)
         print(f'The optimum C that maximizes T1: {best_C} for {max_T1} cycles (T1)')
         
-        # Plot C_range vs. T1_list
-        plt.figure(figsize=(8, 6))
-        plt.plot(C_range, T1_list, marker='o', linestyle='-', color='b', label='T1 values')
-        # Labels and Title
-        plt.title("C Range vs T1 Values", fontsize=14)
-        plt.xlabel("C (number of cycles)", fontsize=12)
-        plt.ylabel("T1 (Iteration when first node dies)", fontsize=12)
-        plt.grid(alpha=0.5)
-        plt.legend(fontsize=10)
-        plt.xticks(C_range)
-        plt.tight_layout()
-
-        # Show the plot
-        plt.show()
+        if plot:
+            plot_T1_vs_C(C_range, T1_list)
 
         return best_remaining_energies
         
     
     pass
-    dead_counts = []
-    energies = []
-    iter = 0
-    elect_cluster_heads = []
-    while True:
-        if iter % C == 0:
-            elect_cluster_heads = elect_cluster_head(groups, sink_x, sink_y, C) 
-
-        dead_count, curr_energies = run_iteration(groups, elect_cluster_heads, sink_x, sink_y, R)
-        dead_counts.append(dead_count)
-        energies.append(curr_energies)
-
-        if elect_cluster_heads.count(-1) == 5:
-            break
-
-        iter += 1
+    milestones = MilestoneCollector(N_sensors) #first, half, last
+    collectors = [milestones]
+    if trace is not None:
+        trace = trace if isinstance(trace, TraceWriter) else TraceWriter(trace)
+        collectors.append(trace)
+    dead_counts = simulate_rotation(groups, sink_x, sink_y, C, R, engine, collectors, election, routing, hooks)
     
-    dead_counts = np.array(dead_counts)
-    special_cycles = [(np.argmin(np.abs(dead_counts-x))) for x in [1,N_sensors/2,N_sensors]] #first, half, last
+    special_cycles = milestones.special_cycles
     special_values = len(nodes) - dead_counts[special_cycles] # Corresponding Values, Cuz they're not necessarily 1,50,100 (Maybe more than one died at the same cycled)
+    special_energies = milestones.special_energies
+    if trace is not None:
+        trace.close()
+        special_energies = Trace(trace.path).rows(special_cycles)
     
-    return len(nodes) - np.array(dead_counts), np.array(energies)[special_cycles], np.array(special_cycles)+1, np.array(special_values),nodes
+    return len(nodes) - np.array(dead_counts), special_energies, np.array(special_cycles)+1, np.array(special_values),nodes
     # In the prev line, returned special_cycles + 1 , to start at cycle 1 not 0
-    
-run_simulation(50,50, 100,'sim_case', 10)
\ No newline at end of file
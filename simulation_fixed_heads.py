@@ -1,59 +1,52 @@
-from node import Node
+from node import NetworkState, HEAD_MODE, DEFAULT_MODEL, gather_nodes
+from cost_cache import get_cost_cache, sink_key
+from grouping import group_nodes
 import numpy as np 
-import matplotlib.pyplot as plt
-import pickle
 import random
+from result_cache import as_cache, cached_positions
+from metrics import MilestoneCollector, notify, stopped
+from energy_trace import Trace, TraceWriter
+from rendering import finish_figure
+from active_set import ActiveSet
 
-def generate_topology_with_fixed_heads(N, R, x1=0, x2=100, y1=0, y2=100, sink_center=(50,50)):
-    np.random.seed(70)
-    potential_points = N**2
-    X = np.linspace(x1, x2, potential_points)
-    Y = np.linspace(y1, y2, potential_points)
-    
-    ind_x = np.random.choice(potential_points, size=N, replace=False)
-    ind_y = np.random.choice(potential_points, size=N, replace=False)
+def generate_topology_with_fixed_heads(N, R, x1=0, x2=100, y1=0, y2=100, sink_center=(50,50), kind="legacy", seed=70, n_heads=5,
+                                       cache=None):
+    """Sensors deployed as in simulation.generate_topology plus the fixed heads, see place_fixed_heads."""
+    X, Y = cached_positions(cache, N, kind, x1, x2, y1, y2, seed=seed)
+    return place_fixed_heads(X, Y, R, sink_center, n_heads)
 
-    X = X[ind_x]
-    Y = Y[ind_y]
-    
-    nodes = [Node(X[i], Y[i]) for i in range(len(X))]
-    
-    angles = np.linspace(0, 2 * np.pi, 6)[:-1]  # 5 equally spaced angles
-    cluster_heads = []
-    
-    for angle in angles:
-        x = sink_center[0] + R * np.cos(angle)
-        y = sink_center[1] + R * np.sin(angle)
-        head = Node(x, y)
-        head.energy = 4  # Set initial energy to 4 joules
-        head.MODE = "head"  # Set as permanent cluster head
-        cluster_heads.append(head)
-    
-    groups = {i: [] for i in range(5)}  # 5 fixed groups
+def place_fixed_heads(X, Y, R, sink_center=(50,50), n_heads=5, model=None):
+    """Build sensors at (X, Y) plus `n_heads` fixed heads on a circle of radius R around the sink.
+
+    `model` (node.EnergyModel) sets the radio costs and initial energies.
+    """
+    N = len(X)
+    angles = np.linspace(0, 2 * np.pi, n_heads + 1)[:-1]  # equally spaced angles
+    head_x = sink_center[0] + R * np.cos(angles)
+    head_y = sink_center[1] + R * np.sin(angles)
+
+    # Sensors and heads share one state so a round is a single batched update
+    state = NetworkState(np.concatenate([X, head_x]), np.concatenate([Y, head_y]), model=model)
+    state.mode[N:] = HEAD_MODE  # Set as permanent cluster head
+    state.energy[:] = state.model.initial_energies(state)  # 4 joules for the heads by default
+    all_nodes = state.nodes()
+    nodes, cluster_heads = all_nodes[:N], all_nodes[N:]
     
-    for node in nodes:
-        min_dist = float('inf')
-        nearest_head_idx = -1
-        
-        for i, head in enumerate(cluster_heads):
-            dist = node.distance_to_node(head)
-            if dist < min_dist:
-                min_dist = dist
-                nearest_head_idx = i
-        
-        groups[nearest_head_idx].append(node)
+    # Fixed groups, every sensor with its nearest head
+    groups = group_nodes((state, np.arange(N)), n_heads, "nearest_head", heads=np.arange(N, N + n_heads))
     
     return nodes, cluster_heads, groups
 
-def graph_topology_with_heads(nodes, cluster_heads, sink_x, sink_y, sim_case, energies=None, cycle=None):
-    plt.figure(figsize=(10,10))
+def graph_topology_with_heads(nodes, cluster_heads, sink_x, sink_y, sim_case, energies=None, cycle=None, show=True, save_path=None):
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(10,10))
     
     # Plot regular nodes
     X_coords = [node.x for node in nodes]
     y_coords = [node.y for node in nodes]
     
     if energies is not None:
-        scatter = plt.scatter(X_coords, y_coords, c=energies, cmap='viridis', s=100, edgecolor='k')
+        scatter = plt.scatter(X_coords, y_coords, c=np.asarray(energies), cmap='viridis', s=100, edgecolor='k')
         cbar = plt.colorbar(scatter)
         cbar.set_label('Energy')
     else:
@@ -80,95 +73,214 @@ def graph_topology_with_heads(nodes, cluster_heads, sink_x, sink_y, sim_case, en
     plt.ylabel('Y position (m)')
     plt.legend()
     plt.grid(True)
-    plt.show()
+    return finish_figure(fig, show, save_path)
+
+def fixed_round_costs(nodes, cluster_heads, sink_x, sink_y, router=None):
+    """Energy every sensor and head spends in one round.
+
+    Sensors pay the Tx cost to their nearest alive head, heads pay
+    Rx + aggregation + Tx to the sink. Returns (state, idx, cost, heads_left)
+    with `idx` the sensors followed by the heads.
+    """
+    state, idx = gather_nodes(nodes + cluster_heads)
+    node_idx, head_idx = idx[:len(nodes)], idx[len(nodes):]
 
-def run_fixed_head_iteration(nodes, cluster_heads, groups, sink_x, sink_y):
-    dead_count = 0
-    remaining_energies = []
+    costs = get_cost_cache(state, sink_x, sink_y)
+    # Nearest alive head per node, only members of freshly dead heads get reassigned
+    assignment = costs.head_assignment(node_idx, head_idx)
+    assignment.update()
+
+    cost = np.concatenate([assignment.cost, costs.head_costs(head_idx)])
+    if router is not None:
+        # Routes over the heads still alive, rebuilt when one of them dies
+        is_head = np.concatenate([np.zeros(len(node_idx), dtype=bool), assignment.index.alive])
+        head_cost, relay_pos, relay_cost = router.costs(state, idx, is_head, sink_x, sink_y)
+        cost[is_head] = head_cost
+        cost[relay_pos] += relay_cost
+    return state, idx, cost, assignment.index.alive.any()
+
+def run_fixed_head_iteration(nodes, cluster_heads, groups, sink_x, sink_y, router=None, hooks=None, iter=0):
+    state, idx, cost, heads_left = fixed_round_costs(nodes, cluster_heads, sink_x, sink_y, router)
+    node_idx, head_idx = idx[:len(nodes)], idx[len(nodes):]
+    if hooks is not None:
+        hooks.lap("routing")
+        was_dead = state.dead[idx] if hooks.wants_deaths else None
+
+    alive = np.flatnonzero(~state.dead[node_idx])
     
     # Process regular nodes
-    for node in nodes:
-        if not node.isDead():
-            nearest_head = None
-            min_dist = float('inf')
-            
-            # Find nearest active cluster head
-            for head in cluster_heads:
-                if not head.isDead():
-                    dist = node.distance_to_node(head)
-                    if dist < min_dist:
-                        min_dist = dist
-                        nearest_head = head
-            
-            if nearest_head is not None:
-                node.consume_energy(nearest_head.x, nearest_head.y)
-                if node.isDead():
-                    dead_count += 1
-            else:
-                node.set_dead()
-                dead_count += 1
-                
-        else:
-            dead_count += 1
-        
-        remaining_energies.append(node.energy)
+    if not heads_left:
+        state.dead[node_idx[alive]] = True
+    elif len(alive) > 0:
+        is_head = state.mode[node_idx[alive]] == HEAD_MODE
+        state.spend(node_idx[alive], cost[alive], is_head)
+
+    dead_count = int(np.count_nonzero(state.dead[node_idx]))
     
     # Process cluster heads
-    for head in cluster_heads:
-        if not head.isDead():
-            head.consume_energy(sink_x, sink_y)
-        remaining_energies.append(head.energy)
+    alive_heads = np.flatnonzero(~state.dead[head_idx])
+    heads = head_idx[alive_heads]
+    state.spend(heads, cost[len(nodes) + alive_heads], state.mode[heads] == HEAD_MODE)
+    if hooks is not None:
+        hooks.lap("energy_update")
+    remaining_energies = state.energy[idx].copy()
+    if hooks is not None:
+        hooks.lap("metrics")
+        if hooks.wants_deaths:
+            hooks.deaths(iter, idx, state.dead[idx] & ~was_dead, np.arange(len(idx)) >= len(nodes))
     
     return dead_count, remaining_energies
 
-def run_fixed_head_simulation(sink_x, sink_y, N_sensors, R):
-    nodes, cluster_heads, groups = generate_topology_with_fixed_heads(N_sensors, R, sink_center=(sink_x, sink_y))
-    
-    # Initial topology visualization
-    graph_topology_with_heads(nodes, cluster_heads, sink_x, sink_y, 'Initial')
-    
+def simulate_fixed_heads(nodes, cluster_heads, groups, sink_x, sink_y, engine="round", collectors=(), router=None, hooks=None,
+                         checkpoints=None, resume=None, model=None, sink_path=None):
+    """Run the fixed-head network until all heads or all sensors are dead.
+
+    Returns the per-round dead counts. Anything else (energies at milestones,
+    snapshots, aggregates) is recorded by the `collectors`, see metrics.py;
+    a collector can also end the run early (metrics.EarlyStop).
+    `engine` is "round" for the round by round loop or "event" for the
+    skip-ahead engine. A routing.Router lets far heads relay; the heads all
+    sit at the placement radius, so its own R decides which ones do.
+    `hooks` (hooks.Hooks) observe rounds and deaths and time the loop phases.
+    `checkpoints`, `resume`, `model`, several sinks and `sink_path` work as
+    in simulation.simulate_rotation.
+
+    The round loop only visits the sensors and heads still alive
+    (active_set.ActiveSet) and rebuilds the costs when a head dies or the
+    sink moves.
+    """
+    if model is not None:
+        gather_nodes(nodes + cluster_heads)[0].set_model(model)
+    if engine == "event":
+        # Skip-ahead engine, same results without stepping every round
+        from event_driven import run_fixed_head_events
+        return run_fixed_head_events(nodes, cluster_heads, sink_x, sink_y, collectors, router, hooks, checkpoints, resume,
+                                     sink_path)
+
     dead_counts = []
-    energies = []
     iter = 0
+    if resume is not None:
+        dead_counts = list(resume.dead_counts)
+        iter = resume.rounds
     
+    active = None
     while True:
-        dead_count, curr_energies = run_fixed_head_iteration(nodes, cluster_heads, groups, sink_x, sink_y)
+        if sink_path is not None:
+            position = sink_path.at(iter)
+            if active is not None and sink_key(*position) != sink_key(sink_x, sink_y):
+                active = None
+            sink_x, sink_y = position
+        if hooks is not None:
+            hooks.emit("on_round_start", iter)
+            hooks.start()
+        if active is None or active.heads_died:
+            # Members of the dead head move to their next nearest head
+            state, idx, cost, heads_left = fixed_round_costs(nodes, cluster_heads, sink_x, sink_y, router)
+            is_head = np.arange(len(idx)) >= len(nodes)
+            if not heads_left:
+                # Nobody left to report to, every sensor dies at once
+                sensors = idx[~is_head]
+                if hooks is not None and hooks.wants_deaths:
+                    hooks.deaths(iter, sensors, ~state.dead[sensors], is_head[~is_head])
+                state.dead[sensors] = True
+            active = ActiveSet(state, idx, cost, is_head, ~is_head, keep_heads=False)
+        if hooks is not None:
+            hooks.lap("routing")
+        dead_count = active.step(hooks, iter)
+        if hooks is not None:
+            hooks.lap("energy_update")
         dead_counts.append(dead_count)
-        energies.append(curr_energies)
+        notify(collectors, iter, [dead_count], lambda offsets: [active.energies()] * len(offsets))
+        if hooks is not None:
+            hooks.lap("metrics")
+            hooks.emit("on_round_end", iter, dead_count)
         
         # Check if all cluster heads are dead or all nodes are dead
         all_heads_dead = all(head.isDead() for head in cluster_heads)
-        if all_heads_dead or dead_count == len(nodes):
+        if all_heads_dead or dead_count == len(nodes) or stopped(collectors):
             break
             
         iter += 1
+        if checkpoints is not None and checkpoints.due(iter):
+            checkpoints.save_fixed(iter, nodes, cluster_heads, dead_counts, sink_x, sink_y, collectors, router, sink_path)
+
+    return np.array(dead_counts)
+
+def _cached_fixed_run(cache, sink_x, sink_y, N_sensors, R, engine, kind, seed):
+    # Everything a plain run returns, the nodes as their final state arrays
+    def compute():
+        alive, energies, cycles, values, nodes, cluster_heads = run_fixed_head_simulation(sink_x, sink_y, N_sensors, R, engine,
+                                                                                          kind=kind, seed=seed)
+        state, idx = gather_nodes(nodes + cluster_heads)
+        return {"alive": alive, "energies": np.asarray(energies), "cycles": cycles, "values": values,
+                "x": state.x[idx], "y": state.y[idx], "energy": state.energy[idx], "dead": state.dead[idx],
+                "mode": state.mode[idx]}
+
+    arrays = cache.cached("fixed_run", compute, sink=(sink_x, sink_y), N=N_sensors, R=R, deployment=kind, seed=seed,
+                          model=DEFAULT_MODEL)
+    state = NetworkState(arrays["x"], arrays["y"], arrays["energy"])
+    state.dead[:] = arrays["dead"]
+    state.mode[:] = arrays["mode"]
+    all_nodes = state.nodes()
+    return (arrays["alive"], arrays["energies"], arrays["cycles"], arrays["values"],
+            all_nodes[:N_sensors], all_nodes[N_sensors:])
+
+def run_fixed_head_simulation(sink_x, sink_y, N_sensors, R, engine="round", plot=False, router=None, hooks=None, trace=None,
+                              cache=None, kind="legacy", seed=70):
+    """Fixed-head run; `trace`, `kind` and `seed` work as in simulation.run_simulation.
+
+    With a `cache` (result_cache.ResultCache or directory) a plain run (no
+    router, hooks, trace or plots) is only simulated once.
+    """
+    cache = as_cache(cache)
+    if cache is not None and not plot and router is None and hooks is None and trace is None:
+        return _cached_fixed_run(cache, sink_x, sink_y, N_sensors, R, engine, kind, seed)
+    nodes, cluster_heads, groups = generate_topology_with_fixed_heads(N_sensors, R, sink_center=(sink_x, sink_y), kind=kind,
+                                                                      seed=seed)
+    
+    # Initial topology visualization
+    if plot:
+        graph_topology_with_heads(nodes, cluster_heads, sink_x, sink_y, 'Initial')
     
-    dead_counts = np.array(dead_counts)
     total_nodes = len(nodes)
-    special_cycles = [(np.argmin(np.abs(dead_counts-x))) for x in [1, total_nodes/2, total_nodes]]
+    milestones = MilestoneCollector(total_nodes)
+    collectors = [milestones]
+    if trace is not None:
+        trace = trace if isinstance(trace, TraceWriter) else TraceWriter(trace)
+        collectors.append(trace)
+    dead_counts = simulate_fixed_heads(nodes, cluster_heads, groups, sink_x, sink_y, engine, collectors, router, hooks)
+    
+    special_cycles = milestones.special_cycles
     special_values = total_nodes - dead_counts[special_cycles]
+    special_energies = milestones.special_energies
+    if trace is not None:
+        trace.close()
+        special_energies = Trace(trace.path).rows(special_cycles)
     
     return (total_nodes - np.array(dead_counts), 
-            np.array(energies)[special_cycles], 
+            special_energies, 
             np.array(special_cycles)+1, 
             np.array(special_values),
             nodes,
             cluster_heads)
 
-def find_optimal_R(sink_x, sink_y, N_sensors, R_range):
-    """Find optimal R by testing different radii"""
+def lifetime_vs_R(sink_x, sink_y, N_sensors, R_range, cache=None, kind="legacy", seed=70):
+    """(R, network lifetime) for every radius in R_range"""
     results = []
     
     for R in R_range:
-        network_lifetime, _, cycles, _, _, _ = run_fixed_head_simulation(sink_x, sink_y, N_sensors, R)
+        network_lifetime, _, cycles, _, _, _ = run_fixed_head_simulation(sink_x, sink_y, N_sensors, R, cache=cache, kind=kind,
+                                                                         seed=seed)
         results.append((R, len(network_lifetime)))  # Store R and network lifetime
-        
-    # Find R with maximum lifetime
+    return results
+
+def plot_lifetime_vs_R(results, show=True, save_path=None):
+    import matplotlib.pyplot as plt
     optimal_R = max(results, key=lambda x: x[1])
     
     # Plot results
     Rs, lifetimes = zip(*results)
-    plt.figure(figsize=(10, 6))
+    fig = plt.figure(figsize=(10, 6))
     plt.plot(Rs, lifetimes, 'bo-')
     plt.axvline(x=optimal_R[0], color='r', linestyle='--', label=f'Optimal R = {optimal_R[0]:.1f}m')
     plt.xlabel('Radius (m)')
@@ -176,7 +288,17 @@ def find_optimal_R(sink_x, sink_y, N_sensors, R_range):
     plt.title('Network Lifetime vs. Cluster Head Placement Radius')
     plt.grid(True)
     plt.legend()
-    plt.show()
+    return finish_figure(fig, show, save_path)
+
+def find_optimal_R(sink_x, sink_y, N_sensors, R_range, plot=False, cache=None, kind="legacy", seed=70):
+    """Find optimal R by testing different radii"""
+    results = lifetime_vs_R(sink_x, sink_y, N_sensors, R_range, cache, kind, seed)
+        
+    # Find R with maximum lifetime
+    optimal_R = max(results, key=lambda x: x[1])
+    
+    if plot:
+        plot_lifetime_vs_R(results)
     
     return optimal_R[0]
 
@@ -0,0 +1,64 @@
+import numpy as np
+
+# Mobile sinks. Wherever the engines take `sink_x, sink_y` they also accept
+# several sinks as arrays of positions (heads report to their nearest one);
+# a SinkPath passed as `sink_path` moves the sink(s) over the rounds. Each
+# position's costs are cached by cost_cache, so revisiting a position (a
+# looping path) costs nothing, and in between elections only the heads'
+# costs to a new position are computed.
+
+
+class SinkPath():
+    """Sink position(s) over the rounds of a run.
+
+    Position i, (x[i], y[i]), holds for `every` rounds; x[i] and y[i] may be
+    arrays when several sinks move together. After the last position the
+    path starts over when `loop`, otherwise the sink stays there.
+    """
+    def __init__(self, x, y, every=1, loop=True):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.every = every
+        self.loop = loop
+
+    def __len__(self):
+        return len(self.x)
+
+    def _step(self, round):
+        step = round // self.every
+        return step % len(self.x) if self.loop else min(step, len(self.x) - 1)
+
+    def at(self, round):
+        """Sink position(s) during `round`."""
+        step = self._step(round)
+        if self.x.ndim == 1:
+            return float(self.x[step]), float(self.y[step])
+        return self.x[step], self.y[step]
+
+    def rounds_left(self, round):
+        """Rounds from `round` on before the sink moves (None once it has stopped)."""
+        if not self.loop and round // self.every >= len(self.x) - 1:
+            return None
+        return self.every - round % self.every
+
+
+def circle_path(center=(50, 50), radius=25, n_points=36, every=1):
+    """A sink circling `center` at `radius`, one lap every n_points * every rounds."""
+    angles = np.linspace(0, 2 * np.pi, n_points, endpoint=False)
+    return SinkPath(center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles), every)
+
+
+def line_path(start, end, n_points=10, every=1, back=True):
+    """A sink shuttling from `start` to `end` (and back, when `back`)."""
+    t = np.linspace(0, 1, n_points)
+    if back:
+        t = np.concatenate([t, t[-2:0:-1]])
+    return SinkPath(start[0] + t * (end[0] - start[0]), start[1] + t * (end[1] - start[1]), every)
+
+
+def span_until_move(sink_path, round, span):
+    """`span` cut short where the sink moves, for the skip-ahead engines."""
+    if sink_path is None:
+        return span
+    left = sink_path.rounds_left(round)
+    return span if left is None else min(span, left)
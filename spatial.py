@@ -0,0 +1,181 @@
+import numpy as np
+from node import distance
+
+# Up to this many alive heads a query compares against every head in one
+# vectorized pass, which beats walking the grid's rings from Python.
+BRUTE_FORCE_HEADS = 64
+CHUNK = 1 << 20  # query-head pairs per brute force pass
+
+
+class HeadIndex():
+    """Uniform grid over cluster head positions.
+
+    Answers nearest-alive-head queries for many points at once by scanning
+    rings of cells around each query, or by brute force when few heads are
+    alive, and supports removing heads when they die. Ties are broken
+    towards the lowest head index, like a linear scan.
+    """
+    def __init__(self, x, y, cell=None):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.alive = np.ones(len(self.x), dtype=bool)
+
+        self.x0, self.y0 = self.x.min(), self.y.min()
+        span_x, span_y = self.x.max() - self.x0, self.y.max() - self.y0
+        if cell is None:
+            # About one head per cell
+            cell = max(span_x, span_y) / max(1.0, np.sqrt(len(self.x)))
+        self.cell = cell if cell > 0 else 1.0
+        self.n_cols = int(span_x / self.cell) + 1
+        self.n_rows = int(span_y / self.cell) + 1
+
+        # Heads bucketed per cell, CSR style
+        col, row = self._cell_of(self.x, self.y)
+        cell_id = row * self.n_cols + col
+        self.bucket = np.argsort(cell_id, kind="stable")
+        bounds = np.searchsorted(cell_id[self.bucket], np.arange(self.n_rows * self.n_cols + 1))
+        self.start, self.count = bounds[:-1], np.diff(bounds)
+        self.max_count = int(self.count.max())
+
+    def _cell_of(self, x, y):
+        col = np.floor((x - self.x0) / self.cell).astype(np.int64)
+        row = np.floor((y - self.y0) / self.cell).astype(np.int64)
+        return col, row
+
+    def remove(self, head):
+        self.alive[head] = False
+
+    def nearest(self, qx, qy):
+        """(head index, distance) of the nearest alive head for every query point.
+
+        Points with no alive head left get index -1 and distance inf.
+        """
+        qx = np.asarray(qx, dtype=float)
+        qy = np.asarray(qy, dtype=float)
+        best = np.full(len(qx), -1, dtype=np.int64)
+        best_d = np.full(len(qx), np.inf)
+        alive = np.flatnonzero(self.alive)
+        if len(alive) == 0:
+            return best, best_d
+        if len(alive) <= BRUTE_FORCE_HEADS:
+            return self._brute_force(qx, qy, alive)
+
+        # Queries outside the grid start from the nearest cell in it
+        col, row = self._cell_of(qx, qy)
+        col = np.clip(col, 0, self.n_cols - 1)
+        row = np.clip(row, 0, self.n_rows - 1)
+        todo = np.arange(len(qx))
+        ring = 0
+        while len(todo) > 0:
+            c, r = col[todo], row[todo]
+            for dc, dr in _ring_offsets(ring):
+                cc, rr = c + dc, r + dr
+                inside = (cc >= 0) & (cc < self.n_cols) & (rr >= 0) & (rr < self.n_rows)
+                cell_id = np.where(inside, rr * self.n_cols + cc, 0)
+                count = np.where(inside, self.count[cell_id], 0)
+                for slot in range(self.max_count):
+                    has = slot < count
+                    if not has.any():
+                        break
+                    q = todo[has]
+                    head = self.bucket[self.start[cell_id[has]] + slot]
+                    d = distance(qx[q], qy[q], self.x[head], self.y[head])
+                    better = self.alive[head] & ((d < best_d[q]) | ((d == best_d[q]) & (head < best[q])))
+                    best[q[better]] = head[better]
+                    best_d[q[better]] = d[better]
+
+            done = best_d[todo] < self._unseen_distance(qx[todo], qy[todo], c, r, ring)
+            todo = todo[~done]
+            ring += 1
+            if len(todo) > 0 and (2 * ring + 1)**2 * self.max_count > len(alive):
+                # The next ring scans more slots than there are heads, compare with all of them
+                best[todo], best_d[todo] = self._brute_force(qx[todo], qy[todo], alive)
+                break
+
+        return best, best_d
+
+    def _unseen_distance(self, qx, qy, col, row, ring):
+        """Lower bound on the distance to the cells more than `ring` rings from (col, row), inf once none are left."""
+        x0, y0, cell = self.x0, self.y0, self.cell
+        bound = np.full(len(qx), np.inf)
+        for side, gap in [(col - ring > 0, qx - (x0 + (col - ring) * cell)),
+                          (col + ring < self.n_cols - 1, x0 + (col + ring + 1) * cell - qx),
+                          (row - ring > 0, qy - (y0 + (row - ring) * cell)),
+                          (row + ring < self.n_rows - 1, y0 + (row + ring + 1) * cell - qy)]:
+            bound = np.where(side, np.minimum(bound, gap), bound)
+        return bound
+
+    def _brute_force(self, qx, qy, alive):
+        """(head index, distance) of the nearest of the heads `alive` for every query point."""
+        best = np.empty(len(qx), dtype=np.int64)
+        best_d = np.empty(len(qx))
+        hx, hy = self.x[alive], self.y[alive]
+        step = max(1, CHUNK // len(alive))
+        for start in range(0, len(qx), step):
+            part = slice(start, start + step)
+            d = distance(qx[part, None], qy[part, None], hx, hy)
+            nearest = np.argmin(d, axis=1)  # first of equals, the lowest head index
+            best[part] = alive[nearest]
+            best_d[part] = d[np.arange(len(nearest)), nearest]
+        return best, best_d
+
+
+def _ring_offsets(ring):
+    if ring == 0:
+        return [(0, 0)]
+    offsets = [(dc, dr) for dc in range(-ring, ring + 1) for dr in (-ring, ring)]
+    offsets += [(dc, dr) for dc in (-ring, ring) for dr in range(-ring + 1, ring)]
+    return offsets
+
+
+class HeadAssignment():
+    """Which fixed head every node reports to, and the Tx cost of doing so.
+
+    Built once from a HeadIndex. When heads die only their members are
+    looked up again, the rest of the network keeps its assignment.
+    """
+    def __init__(self, state, node_idx, head_idx):
+        self.state = state
+        self.node_idx = node_idx
+        self.head_idx = head_idx
+        self._assign_all()
+
+    def _assign_all(self):
+        state = self.state
+        self.index = HeadIndex(state.x[self.head_idx], state.y[self.head_idx])
+        self.index.alive[:] = ~state.dead[self.head_idx]
+        self.head_of, dist = self.index.nearest(state.x[self.node_idx], state.y[self.node_idx])
+        self.cost = state.model.transmit(dist, self.node_idx)
+        self.members = _members_by_head(self.head_of, len(self.head_idx))
+
+    def update(self):
+        """Follow head deaths since the last call; returns the positions of reassigned nodes."""
+        head_dead = self.state.dead[self.head_idx]
+        if (~head_dead & ~self.index.alive).any():
+            # A head came back to life (state was reset), start over
+            self._assign_all()
+            return np.arange(len(self.node_idx))
+
+        newly_dead = np.flatnonzero(head_dead & self.index.alive)
+        if len(newly_dead) == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        self.index.remove(newly_dead)
+        moved = np.concatenate([self.members[h] for h in newly_dead])
+        for h in newly_dead:
+            self.members[h] = np.zeros(0, dtype=np.intp)
+
+        state = self.state
+        nodes = self.node_idx[moved]
+        new_head, dist = self.index.nearest(state.x[nodes], state.y[nodes])
+        self.head_of[moved] = new_head
+        self.cost[moved] = state.model.transmit(dist, nodes)
+        for h in np.unique(new_head[new_head >= 0]):
+            self.members[h] = np.concatenate([self.members[h], moved[new_head == h]])
+        return moved
+
+
+def _members_by_head(head_of, n_heads):
+    order = np.argsort(head_of, kind="stable")
+    bounds = np.searchsorted(head_of[order], np.arange(n_heads + 1))
+    return [order[bounds[h]:bounds[h + 1]] for h in range(n_heads)]
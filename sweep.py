@@ -0,0 +1,128 @@
+import csv
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from node import NetworkState
+from election import Election
+from topology import generate_positions
+from simulation import generate_groups, simulate_rotation
+from simulation_fixed_heads import place_fixed_heads, simulate_fixed_heads
+from metrics import EarlyStop
+from result_cache import cached_positions, cached_summary
+
+# Parameter sweeps over independent simulations, fanned out over a process
+# pool. Topologies are generated once in the parent per (N, seed) and handed
+# to every worker read-only; each configuration gets its own seed derived
+# from the sweep seed and its position in the grid, so results do not
+# depend on the number of workers or on scheduling.
+
+DEFAULTS = {
+    "mode": "rotation",  # "rotation" (elected heads) or "fixed" (heads on a circle of radius R)
+    "C": 5,
+    "R": 25,
+    "sink": (50, 50),
+    "N": 100,
+    "n_cluster": 5,
+    "policy": "uniform",  # head election policy, see election.POLICIES
+    "seed": 0,  # election seed, run_sweep derives one per configuration
+}
+
+_topologies = {}
+
+
+def sweep_grid(**axes):
+    """All combinations of the given axes, e.g. sweep_grid(C=range(2, 11), N=[100, 1000])."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def _init_worker(topologies):
+    global _topologies
+    _topologies = topologies
+
+
+def _lifetime_metrics(dead_counts, N):
+    """1-based rounds of first, half and last node death (-1 if never reached)."""
+    metrics = {}
+    for name, target in [("T1", 1), ("T_half", N / 2), ("T_last", N)]:
+        reached = np.flatnonzero(dead_counts >= target)
+        metrics[name] = int(reached[0]) + 1 if len(reached) else -1
+    metrics["lifetime"] = len(dead_counts)
+    return metrics
+
+
+def run_config(config, topology_seed=70, kind="uniform", engine="event", stop=None, max_rounds=None, cache=None):
+    """Run one configuration and return its row of the result table.
+
+    With `stop` (a metric name) the run ends as soon as that metric is
+    known, and with `max_rounds` once it ran past that many rounds; the row
+    then says whether it was `truncated`, and only the `stop` metric (or a
+    lower bound of it) is meaningful. Rows already in `cache` (a
+    result_cache.ResultCache or directory) are not simulated again.
+    """
+    config = {**DEFAULTS, **config}
+    if cache is not None:
+        # Both engines give the same results, the engine is not part of the key
+        metrics = cached_summary(cache, "sweep_row", lambda: _metrics(run_config(config, topology_seed, kind, engine, stop, max_rounds)),
+                                 config=config, topology_seed=topology_seed, deployment=kind, stop=stop, max_rounds=max_rounds)
+        return {**config, **metrics}
+    collectors = []
+    if stop is not None or max_rounds is not None:
+        collectors.append(EarlyStop(config["N"], stop or "lifetime", max_rounds))
+    X, Y = _topologies.get((config["N"], topology_seed, kind)) or generate_positions(config["N"], kind, seed=topology_seed)
+    sink_x, sink_y = config["sink"]
+
+    if config["mode"] == "fixed":
+        nodes, cluster_heads, groups = place_fixed_heads(X, Y, config["R"], (sink_x, sink_y), config["n_cluster"])
+        dead_counts = simulate_fixed_heads(nodes, cluster_heads, groups, sink_x, sink_y, engine, collectors)
+    else:
+        groups = generate_groups(NetworkState(X, Y).nodes(), config["n_cluster"])
+        election = Election(config["policy"], config["seed"])
+        dead_counts = simulate_rotation(groups, sink_x, sink_y, config["C"], config["R"], engine, collectors, election)
+
+    row = {**config, **_lifetime_metrics(dead_counts, config["N"])}
+    if collectors:
+        row["truncated"] = collectors[0].truncated
+    return row
+
+
+def _metrics(row):
+    return {name: row[name] for name in ("T1", "T_half", "T_last", "lifetime", "truncated") if name in row}
+
+
+def run_sweep(configs, processes=None, seed=0, topology_seed=70, kind="uniform", engine="event", cache=None):
+    """Run every configuration on a process pool, returns one row (dict) per configuration.
+
+    `configs` are dicts overriding DEFAULTS, usually from sweep_grid().
+    processes=1 runs everything in this process. With a `cache` (see
+    run_config) a repeated sweep only simulates the configurations it has
+    not seen.
+    """
+    configs = [{**DEFAULTS, **config} for config in configs]
+    seeds = np.random.SeedSequence(seed).spawn(len(configs))
+    for config, child in zip(configs, seeds):
+        config["seed"] = int(child.generate_state(1)[0])
+
+    topologies = {(N, topology_seed, kind): cached_positions(cache, N, kind, seed=topology_seed)
+                  for N in sorted({config["N"] for config in configs})}
+
+    if processes == 1:
+        _init_worker(topologies)
+        return [run_config(config, topology_seed, kind, engine, cache=cache) for config in configs]
+
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(topologies,)) as pool:
+        futures = [pool.submit(run_config, config, topology_seed, kind, engine, cache=cache) for config in configs]
+        return [future.result() for future in futures]
+
+
+def best_config(rows, metric="T1"):
+    """Row with the largest `metric`."""
+    return max(rows, key=lambda row: row[metric])
+
+
+def save_table(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,98 @@
+import random
+
+import numpy as np
+import pytest
+
+from election import POLICIES, Election
+from event_driven import advance_energy
+from metrics import MilestoneCollector
+from node import NetworkState
+from routing import Router
+from simulation import DEAD_GROUPS, generate_groups, simulate_rotation
+from simulation_fixed_heads import place_fixed_heads, simulate_fixed_heads
+from sinks import circle_path
+from topology import generate_positions
+
+N = 200
+
+
+def _naive(energy, cost, active, rounds):
+    # The pay-or-die rule one node and one round at a time
+    e = np.array(energy, dtype=float)
+    died = np.zeros(len(e), dtype=np.int64)
+    for i in np.flatnonzero(active):
+        for r in range(rounds):
+            if e[i] - cost[i] < 0:
+                died[i] = r + 1
+                break
+            e[i] = e[i] - cost[i]
+    return e, died
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_advance_energy_matches_naive_loop(seed):
+    rng = np.random.default_rng(seed)
+    n = 300
+    energy = rng.choice([rng.uniform(0, 2), 1.0, 2.0, 0.5], n) + rng.integers(0, 50, n) * np.spacing(1.0)
+    ulp = np.spacing(energy)
+    cost = np.select([np.arange(n) % 4 == 0, np.arange(n) % 4 == 1, np.arange(n) % 4 == 2],
+                     [(rng.integers(1, 40, n) + 0.5) * ulp,  # half-ulp multiples, rounding ties
+                      np.zeros(n),
+                      rng.uniform(0, 0.05, n)],
+                     rng.uniform(0, 1e-3, n) * ulp * 2**20)
+    active = rng.random(n) < 0.9
+    rounds = 200
+
+    e, died = advance_energy(energy, cost, active, rounds)
+    expected_e, expected_died = _naive(energy, cost, active, rounds)
+    assert np.array_equal(e, expected_e)
+    assert np.array_equal(died, expected_died)
+
+
+def _assert_same_runs(run):
+    (dead_a, energy_a, dead_flags_a, milestones_a), (dead_b, energy_b, dead_flags_b, milestones_b) = run("round"), run("event")
+    assert np.array_equal(dead_a, dead_b)
+    assert np.array_equal(energy_a, energy_b)
+    assert np.array_equal(dead_flags_a, dead_flags_b)
+    assert np.array_equal(milestones_a.special_cycles, milestones_b.special_cycles)
+    for a, b in zip(milestones_a.special_energies, milestones_b.special_energies):
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize("policy", (None,) + POLICIES)
+@pytest.mark.parametrize("dead_group", DEAD_GROUPS)
+@pytest.mark.parametrize("routing", [None, "heads", "dual_hop"])
+@pytest.mark.parametrize("sink", ["single", "several", "moving"])
+def test_rotation_engines_match(policy, dead_group, routing, sink):
+    X, Y = generate_positions(N, seed=3)
+    sink_x, sink_y = {"single": (50, 150), "several": ([50, -20], [150, 50]), "moving": (0, 0)}[sink]
+    sink_path = circle_path((50, 50), 80, 12, 7) if sink == "moving" else None
+
+    def run(engine):
+        random.seed(4)
+        groups = generate_groups(NetworkState(X, Y).nodes(), 5)
+        election = Election(policy, 4) if policy is not None else None
+        milestones = MilestoneCollector(N)
+        dead_counts = simulate_rotation(groups, sink_x, sink_y, 5, 25, engine, [milestones], election, routing,
+                                        sink_path=sink_path, dead_group=dead_group)
+        return dead_counts, groups.state.energy, groups.state.dead, milestones
+
+    _assert_same_runs(run)
+
+
+@pytest.mark.parametrize("routing", [None, "heads", "dual_hop"])
+@pytest.mark.parametrize("R", [1, 25])
+@pytest.mark.parametrize("moving", [False, True])
+def test_fixed_head_engines_match(routing, R, moving):
+    X, Y = generate_positions(N, seed=3)
+    sink_path = circle_path((50, 50), 40, 12, 20) if moving else None
+
+    def run(engine):
+        nodes, cluster_heads, groups = place_fixed_heads(X, Y, R, (50, 50))
+        milestones = MilestoneCollector(N)
+        router = Router(R, routing) if routing is not None else None
+        dead_counts = simulate_fixed_heads(nodes, cluster_heads, groups, 50, 50, engine, [milestones], router,
+                                           sink_path=sink_path)
+        return dead_counts, nodes.state.energy, nodes.state.dead, milestones
+
+    _assert_same_runs(run)
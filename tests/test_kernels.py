@@ -0,0 +1,105 @@
+import importlib.util
+
+import numpy as np
+import pytest
+
+import kernels
+from election import Election
+from node import NetworkState
+from simulation import generate_groups, simulate_rotation
+from simulation_fixed_heads import place_fixed_heads, simulate_fixed_heads
+from topology import generate_positions
+
+SINK = (50, 50)
+BACKENDS = [pytest.param(name, marks=pytest.mark.skipif(importlib.util.find_spec("numba") is None,
+                                                        reason="numba is not installed"))
+            if name == "numba" else name for name in kernels.BACKENDS]
+
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    previous = kernels.get_backend()
+    yield
+    kernels.set_backend(previous)
+
+
+def _on(backend, run):
+    kernels.set_backend(backend)
+    return run()
+
+
+def _kernel_case(seed, scalar):
+    # Alive and dead nodes, heads and members, costs around the energies so some die
+    rng = np.random.default_rng(seed)
+    N = 1000
+    energy, dead = rng.uniform(0, 1, N), rng.random(N) < 0.3
+    idx = rng.permutation(N)[:N // 2]
+    cost = 0.5 if scalar else rng.uniform(0, 1, len(idx))
+    is_head = False if scalar else rng.random(len(idx)) < 0.2
+    return energy, dead, idx, cost, is_head
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("scalar", [False, True])
+def test_spend_matches_numpy(backend, scalar):
+    def run():
+        energy, dead, idx, cost, is_head = _kernel_case(0, scalar)
+        died = kernels.spend(energy, dead, idx, cost, is_head)
+        return energy, dead, died
+
+    expected = _on("numpy", run)
+    for a, b in zip(expected, _on(backend, run)):
+        assert a.dtype == b.dtype
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_spend_rules(backend):
+    kernels.set_backend(backend)
+    energy = np.array([1.0, 1.0, 0.2, 0.5])
+    dead = np.array([False, True, False, True])
+    died = kernels.spend(energy, dead, np.arange(4), np.array([0.5, 0.5, 0.5, 0.1]), np.array([False, False, False, True]))
+    # Alive nodes pay, dead members do not, the short node dies untouched, a dead head keeps paying
+    assert np.array_equal(energy, [0.5, 1.0, 0.2, 0.4])
+    assert np.array_equal(dead, [False, True, True, True])
+    assert np.array_equal(died, [False, False, True, False])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("engine", ["round", "event"])
+def test_rotation_matches_numpy(backend, engine):
+    X, Y = generate_positions(300, seed=1)
+
+    def run():
+        groups = generate_groups(NetworkState(X, Y).nodes(), 5)
+        dead_counts = simulate_rotation(groups, *SINK, 5, engine=engine, election=Election("uniform", 2))
+        return dead_counts, groups.state.energy, groups.state.dead
+
+    for a, b in zip(_on("numpy", run), _on(backend, run)):
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("engine", ["round", "event"])
+def test_fixed_heads_match_numpy(backend, engine):
+    X, Y = generate_positions(300, seed=1)
+
+    def run():
+        nodes, cluster_heads, groups = place_fixed_heads(X, Y, 25, SINK)
+        dead_counts = simulate_fixed_heads(nodes, cluster_heads, groups, *SINK, engine)
+        return dead_counts, nodes.state.energy, nodes.state.dead
+
+    for a, b in zip(_on("numpy", run), _on(backend, run)):
+        assert np.array_equal(a, b)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        kernels.set_backend("cuda")
+    assert kernels.get_backend() == "numpy"
+
+
+def test_available_backends():
+    available = kernels.available_backends()
+    assert available[0] == "numpy" and "python" in available
+    assert ("numba" in available) == (importlib.util.find_spec("numba") is not None)
@@ -0,0 +1,132 @@
+import numpy as np
+
+# Sensor deployment generators. Every generator draws from its own
+# np.random.Generator and returns (X, Y) arrays in O(N) time and memory.
+
+
+def uniform_positions(N, x1=0, x2=100, y1=0, y2=100, rng=None):
+    rng = np.random.default_rng(rng)
+    X = rng.uniform(x1, x2, N)
+    Y = rng.uniform(y1, y2, N)
+    return X, Y
+
+
+def grid_positions(N, x1=0, x2=100, y1=0, y2=100, rng=None, jitter=0.0):
+    """Regular lattice filled row by row, `jitter` is a fraction of the cell size."""
+    width, height = x2 - x1, y2 - y1
+    cols = max(1, int(np.ceil(np.sqrt(N * width / height))))
+    rows = max(1, int(np.ceil(N / cols)))
+    dx, dy = width / cols, height / rows
+
+    i = np.arange(N)
+    X = x1 + (i % cols + 0.5) * dx
+    Y = y1 + (i // cols + 0.5) * dy
+    if jitter > 0:
+        rng = np.random.default_rng(rng)
+        X = X + rng.uniform(-0.5, 0.5, N) * jitter * dx
+        Y = Y + rng.uniform(-0.5, 0.5, N) * jitter * dy
+    return X, Y
+
+
+def poisson_disk_positions(N, x1=0, x2=100, y1=0, y2=100, rng=None, min_dist=None, n_tries=20):
+    """Blue-noise deployment where no two sensors are closer than `min_dist`.
+
+    Dart throwing over a background grid of min_dist/sqrt(2) cells (one sample
+    per cell at most). Cells are processed in 3x3 interleaved phases so that
+    candidates of one phase can never conflict with each other, which lets each
+    phase be checked against its 5x5 neighbourhood in a single vectorized pass.
+    A random subset of N samples is kept so the whole field stays covered.
+    """
+    rng = np.random.default_rng(rng)
+    width, height = x2 - x1, y2 - y1
+    if min_dist is None:
+        min_dist = 0.7 * np.sqrt(width * height / N)
+
+    cell = min_dist / np.sqrt(2)
+    n_cols = int(np.ceil(width / cell))
+    n_rows = int(np.ceil(height / cell))
+    # Accepted sample per cell (NaN if empty), padded by 2 cells on every side
+    # and stored flat so neighbour lookups are plain offsets
+    stride = n_cols + 4
+    px = np.full((n_rows + 4) * stride, np.nan)
+    py = np.full((n_rows + 4) * stride, np.nan)
+    rows, cols = np.indices((n_rows, n_cols))
+    phases = [(rows[i::3, j::3].ravel(), cols[i::3, j::3].ravel()) for i in range(3) for j in range(3)]
+    offsets = [di * stride + dj for di in range(-2, 3) for dj in range(-2, 3) if (di, dj) != (0, 0)]
+
+    for _ in range(n_tries):
+        for phase, (r, c) in enumerate(phases):
+            cx = (c + rng.random(len(c))) * cell
+            cy = (r + rng.random(len(r))) * cell
+            flat = (r + 2) * stride + c + 2
+            ok = (cx < width) & (cy < height)
+            for offset in offsets:
+                d2 = (px[flat + offset] - cx)**2 + (py[flat + offset] - cy)**2
+                ok &= ~(d2 < min_dist**2)  # NaN (empty cell) compares False
+            px[flat[ok]] = cx[ok]
+            py[flat[ok]] = cy[ok]
+            phases[phase] = (r[~ok], c[~ok])
+
+    filled = ~np.isnan(px)
+    count = int(np.count_nonzero(filled))
+    if count < N:
+        raise ValueError(f"Only {count} sensors fit with min_dist={min_dist}, lower it to place {N}")
+
+    keep = rng.choice(count, size=N, replace=False)
+    return x1 + px[filled][keep], y1 + py[filled][keep]
+
+
+def clustered_positions(N, x1=0, x2=100, y1=0, y2=100, rng=None, n_clusters=None, spread=None):
+    """Thomas-process deployment: sensors scattered normally around random cluster centers."""
+    rng = np.random.default_rng(rng)
+    if n_clusters is None:
+        n_clusters = max(1, N // 100)
+    if spread is None:
+        spread = 0.05 * min(x2 - x1, y2 - y1)
+
+    centers_x, centers_y = uniform_positions(n_clusters, x1, x2, y1, y2, rng)
+    parent = rng.integers(n_clusters, size=N)
+    X = np.empty(N)
+    Y = np.empty(N)
+
+    # Redraw whoever falls outside the field until everyone is inside
+    todo = np.arange(N)
+    while len(todo) > 0:
+        X[todo] = centers_x[parent[todo]] + rng.normal(0, spread, len(todo))
+        Y[todo] = centers_y[parent[todo]] + rng.normal(0, spread, len(todo))
+        todo = todo[(X[todo] < x1) | (X[todo] > x2) | (Y[todo] < y1) | (Y[todo] > y2)]
+
+    return X, Y
+
+
+def legacy_positions(N, x1=0, x2=100, y1=0, y2=100, rng=70):
+    """The original N**2 candidate-lattice sampling, kept to reproduce old figures.
+
+    Quadratic in N, only use it for small networks. `rng` must be an int seed
+    here since it drives the legacy RandomState stream.
+    """
+    random_state = np.random.RandomState(rng)
+    potential_points = N**2
+    X = np.linspace(x1, x2, potential_points)
+    Y = np.linspace(y1, y2, potential_points)
+
+    ind_x = random_state.choice(potential_points, size=N, replace=False)
+    ind_y = random_state.choice(potential_points, size=N, replace=False)
+
+    return X[ind_x], Y[ind_y]
+
+
+DEPLOYMENTS = {
+    "uniform": uniform_positions,
+    "grid": grid_positions,
+    "poisson": poisson_disk_positions,
+    "clustered": clustered_positions,
+    "legacy": legacy_positions,
+}
+
+
+def generate_positions(N, kind="uniform", x1=0, x2=100, y1=0, y2=100, seed=None, **kwargs):
+    """Sensor coordinates for one of the DEPLOYMENTS, seeded per call."""
+    if kind not in DEPLOYMENTS:
+        raise ValueError(f"Unknown deployment '{kind}', choose from {sorted(DEPLOYMENTS)}")
+    return DEPLOYMENTS[kind](N, x1, x2, y1, y2, rng=seed, **kwargs)